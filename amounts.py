@@ -0,0 +1,98 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Dígitos que entran en un float64 sin perder precisión (2**53 ~ 9.007e15)
+EXACT_DIGITS = 15
+
+# Separador de miles que corresponde a cada separador decimal
+THOUSANDS = {'.': ',', ',': '.'}
+
+
+def _as_strings(values):
+    # Un separador al final no es decimal: '5.' o el punto que cierra 'Total: 1.234,56.'
+    return pd.Series(values, dtype=object).fillna('').astype(str).str.strip().str.rstrip('.,')
+
+
+def detect_decimal(*columns):
+    """Separador decimal de un documento ('.' o ','), a partir de todos sus números.
+
+    Decide por mayoría de los valores que no son ambiguos: los que tienen
+    ambos separadores (el último es el decimal), los que tienen un único
+    separador seguido de una cantidad de dígitos distinta de tres y los que
+    repiten el separador (sólo puede ser el de miles). Ante un empate se
+    usa '.', el formato que se asumía antes.
+    """
+    values = pd.concat([_as_strings(column) for column in columns], ignore_index=True)
+    values = values[values.str.contains(r'\d', regex=True)]
+
+    last = values.str.extract(r'([.,])\d*$', expand=False)
+    has_dot = values.str.contains('.', regex=False)
+    has_comma = values.str.contains(',', regex=False)
+    both = has_dot & has_comma
+
+    comma_votes = (both & (last == ',')).sum()
+    dot_votes = (both & (last == '.')).sum()
+
+    # Un solo tipo de separador
+    dot_votes += (has_dot & ~has_comma & values.str.contains(r'\.(?:\d{1,2}|\d{4,})$', regex=True)).sum()
+    dot_votes += (has_comma & ~has_dot & (values.str.count(',') > 1)).sum()
+    comma_votes += (has_comma & ~has_dot & values.str.contains(r',(?:\d{1,2}|\d{4,})$', regex=True)).sum()
+    comma_votes += (has_dot & ~has_comma & (values.str.count(r'\.') > 1)).sum()
+
+    return ',' if comma_votes > dot_votes else '.'
+
+
+def _split(strings, decimal):
+    """Partes de cada número: (negativo, dígitos sin separadores, válido, escala)"""
+    thousands = re.escape(THOUSANDS[decimal])
+    pattern = (rf'^(?P<sign>[-+]?)\$?\s*(?P<int>\d[\d{thousands}]*|)'
+               rf'(?:{re.escape(decimal)}(?P<frac>\d+))?$')
+    parts = strings.str.extract(pattern)
+    valid = (parts['int'].notna() & ((parts['int'] != '') | parts['frac'].notna())).to_numpy()
+
+    integer = parts['int'].fillna('').str.replace(THOUSANDS[decimal], '', regex=False)
+    fraction = parts['frac'].fillna('')
+    scale = int(fraction[valid].str.len().max()) if valid.any() else 0
+
+    digits = (integer + fraction.str.pad(scale, side='right', fillchar='0')).str.lstrip('0')
+    digits = digits.where(digits != '', '0')
+    negative = (parts['sign'] == '-').to_numpy()
+    return negative, digits, valid, scale
+
+
+def _to_int(digits, rows):
+    # numpy convierte los textos a enteros sin pasar por Python celda a celda
+    return digits[rows].to_numpy(dtype=str).astype(np.int64)
+
+
+def parse_numbers(values, decimal='.'):
+    """Columna de textos a números, NaN donde no hay un número.
+
+    El resultado es el float más cercano al valor decimal exacto: la
+    mantisa entera se divide por la escala una sola vez, sin acumular
+    errores de redondeo por separador.
+    """
+    strings = _as_strings(values)
+    negative, digits, valid, scale = _split(strings, decimal)
+    lengths = digits.str.len().to_numpy()
+    exact = valid & (lengths <= EXACT_DIGITS)
+
+    # Como pd.to_numeric, una columna de enteros sin faltantes queda como int64
+    if scale == 0 and len(strings) and exact.all():
+        integers = _to_int(digits, exact)
+        integers[negative] *= -1
+        return pd.Series(integers, index=strings.index)
+
+    result = np.full(len(strings), np.nan)
+    result[exact] = _to_int(digits, exact) / 10 ** scale
+
+    # Valores con más dígitos de los que representa exactamente un float64
+    too_long = valid & ~exact
+    if too_long.any():
+        normalized = strings.str.replace(THOUSANDS[decimal], '', regex=False).str.replace(decimal, '.', regex=False)
+        result[too_long] = pd.to_numeric(normalized[too_long], errors='coerce').to_numpy()
+
+    result[negative & exact] *= -1
+    return pd.Series(result, index=strings.index)
@@ -1,19 +1,48 @@
+import hashlib
+import io
 import os
 import re
-from flask import Flask, request, render_template, send_file
+from flask import Flask, Request, Response, current_app, request, render_template, send_file, jsonify, url_for
 import pdfplumber
 import pandas as pd
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import shutil
 import zipfile
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.backends.backend_pdf import PdfPages
+import json
+import tempfile
+import threading
+import time
+import zlib
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
+import xlsxwriter
+from jobs import JobQueue, QueueFullError
+from pools import ProcessPool, cpu_share
+from result_cache import ResultCache, file_digest
+from pdf_writer import ChunkBuffer, PdfWriter, PdfPage, DESCENT, encodable
+from zip_stream import ZipStream
+import layouts
+import amounts
+from sandbox import BudgetExceeded, Sandbox
+import ocr
+import metrics
+
+class SpooledRequest(Request):
+    """Request que mantiene las subidas en memoria hasta SPOOL_MAX_SIZE bytes"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(
+            max_size=current_app.config['SPOOL_MAX_SIZE'],
+            dir=current_app.config['UPLOAD_FOLDER'],
+            mode='rb+'
+        )
 
 app = Flask(__name__)
+app.request_class = SpooledRequest
 
 # Crear directorios para archivos temporales
 # En producción, usar directorio temporal del sistema si es necesario
@@ -24,367 +53,1062 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.chmod(UPLOAD_FOLDER, 0o777)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB max file size
+# Subidas y documentos generados quedan en memoria hasta este tamaño; después pasan a tmp/
+app.config['SPOOL_MAX_SIZE'] = int(os.environ.get('SPOOL_MAX_SIZE', 8 * 1024 * 1024))
+
+# Cola de trabajos asíncronos (fuera de tmp/: sus resultados tienen su propio TTL)
+app.config['JOBS_FOLDER'] = os.environ.get('JOBS_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs_data'))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))  # Procesos por worker de gunicorn
+app.config['JOB_QUEUE_DEPTH'] = int(os.environ.get('JOB_QUEUE_DEPTH', 16))  # Trabajos pendientes máximos
+app.config['JOB_TTL'] = int(os.environ.get('JOB_TTL', 3600))  # Segundos que se conserva un resultado
+app.config['JOB_STALE_AFTER'] = int(os.environ.get('JOB_STALE_AFTER', 900))  # Segundos sin avance antes de darlo por fallido
+
+job_queue = JobQueue(
+    app.config['JOBS_FOLDER'],
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_QUEUE_DEPTH'],
+    ttl=app.config['JOB_TTL'],
+    stale_after=app.config['JOB_STALE_AFTER']
+)
+
+# Procesamiento por lotes: procesos en paralelo (por defecto, los núcleos de cada worker de gunicorn)
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', cpu_share()))
+batch_pool = ProcessPool(app.config['BATCH_WORKERS'])
+# Tamaño máximo de los PDFs de un lote, ya descomprimidos los ZIPs
+app.config['BATCH_MAX_BYTES'] = int(os.environ.get('BATCH_MAX_BYTES', 256 * 1024 * 1024))
+
+# Extracción en paralelo por rangos de páginas para PDFs grandes
+app.config['PARALLEL_EXTRACTION'] = os.environ.get('PARALLEL_EXTRACTION', '1') == '1'
+app.config['PARALLEL_EXTRACTION_MIN_PAGES'] = int(os.environ.get('PARALLEL_EXTRACTION_MIN_PAGES', 20))
+app.config['EXTRACT_WORKERS'] = int(os.environ.get('EXTRACT_WORKERS', cpu_share()))
+extract_pool = ProcessPool(app.config['EXTRACT_WORKERS'])
+
+# Pre-filtro de páginas: sólo se buscan tablas y totales donde puede haberlos
+app.config['PAGE_PREFILTER'] = os.environ.get('PAGE_PREFILTER', '1') == '1'
+app.config['PREFILTER_MIN_CHARS'] = int(os.environ.get('PREFILTER_MIN_CHARS', 10))
+# Bordes mínimos (horizontales + verticales) en páginas sin encabezado de tabla:
+# un recuadro suelto tiene 4, una grilla con dos celdas al menos 5
+app.config['PREFILTER_MIN_RULINGS'] = int(os.environ.get('PREFILTER_MIN_RULINGS', 5))
+# 'IVA' no sirve: aparece en el encabezado '% IVA' de todas las páginas de la tabla
+TOTALS_KEYWORDS = ('Subtotal', 'Bonificaci', 'Total')
+
+# Layouts de proveedor conocidos, indexados por la huella del encabezado de la tabla
+app.config['LAYOUTS_ENABLED'] = os.environ.get('LAYOUTS_ENABLED', '0') == '1'
+app.config['LAYOUTS_FILE'] = os.environ.get('LAYOUTS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts_data', 'layouts.json'))
+app.config['LAYOUT_LEARN'] = os.environ.get('LAYOUT_LEARN', '0') == '1'  # Registrar los layouts nuevos
+app.config['LAYOUT_SCAN_PAGES'] = int(os.environ.get('LAYOUT_SCAN_PAGES', 3))  # Páginas donde buscar el encabezado
+layout_registry = layouts.LayoutRegistry(app.config['LAYOUTS_FILE'])
+
+# Sandbox de /upload y /api/extract: procesos aislados con límites por PDF
+app.config['SANDBOX_ENABLED'] = os.environ.get('SANDBOX_ENABLED', '1') == '1'
+app.config['SANDBOX_WORKERS'] = int(os.environ.get('SANDBOX_WORKERS', 2))
+app.config['SANDBOX_DEADLINE'] = float(os.environ.get('SANDBOX_DEADLINE', 50))  # Segundos por etapa
+# Segundos de extracción por página en un proceso (~0.22-0.26 medidos con benchmarks/), con margen
+app.config['SANDBOX_PAGE_SECONDS'] = float(os.environ.get('SANDBOX_PAGE_SECONDS', 0.3))
+# Por defecto, las páginas que se pueden extraer dentro del plazo con el pool de extracción
+extract_processes = app.config['EXTRACT_WORKERS'] if app.config['PARALLEL_EXTRACTION'] else 1
+app.config['SANDBOX_MAX_PAGES'] = int(os.environ.get(
+    'SANDBOX_MAX_PAGES',
+    app.config['SANDBOX_DEADLINE'] * extract_processes // app.config['SANDBOX_PAGE_SECONDS']
+))
+app.config['SANDBOX_MAX_MEMORY'] = int(os.environ.get('SANDBOX_MAX_MEMORY', 2 * 1024 * 1024 * 1024))  # Bytes
+app.config['SANDBOX_MAX_TASKS'] = int(os.environ.get('SANDBOX_MAX_TASKS', 50))  # Trabajos antes de reciclar el hijo
+
+sandbox = Sandbox(
+    max_workers=app.config['SANDBOX_WORKERS'],
+    max_tasks_per_child=app.config['SANDBOX_MAX_TASKS'],
+    deadline=app.config['SANDBOX_DEADLINE'],
+    max_memory=app.config['SANDBOX_MAX_MEMORY']
+)
+
+# Procesos para generar PDF y Excel a la vez (output=both) cuando no se usa el sandbox
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', 2))
+render_pool = ProcessPool(app.config['RENDER_WORKERS'])
+
+# Renderer del PDF: 'native' (operadores PDF directos) o 'matplotlib'
+app.config['PDF_RENDERER'] = os.environ.get('PDF_RENDERER', 'native')
+
+# Caché de extracciones por hash del PDF subido
+app.config['RESULT_CACHE_ENABLED'] = os.environ.get('RESULT_CACHE_ENABLED', '1') == '1'
+app.config['RESULT_CACHE_FOLDER'] = os.environ.get('RESULT_CACHE_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_data'))
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+app.config['RESULT_CACHE_TTL'] = int(os.environ.get('RESULT_CACHE_TTL', 7 * 24 * 3600))
+
+result_cache = ResultCache(
+    app.config['RESULT_CACHE_FOLDER'],
+    max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+    ttl=app.config['RESULT_CACHE_TTL']
+)
 
-def cleanup_old_files():
-    """Limpia archivos temporales antiguos"""
-    for filename in os.listdir(UPLOAD_FOLDER):
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+# Caché del cuerpo de las páginas del PDF nativo (todo salvo los datos del cliente)
+app.config['PDF_PAGE_CACHE_ENABLED'] = os.environ.get('PDF_PAGE_CACHE_ENABLED', '1') == '1'
+app.config['PDF_PAGE_CACHE_FOLDER'] = os.environ.get('PDF_PAGE_CACHE_FOLDER', os.path.join(app.config['RESULT_CACHE_FOLDER'], 'pages'))
+app.config['PDF_PAGE_CACHE_MAX_BYTES'] = int(os.environ.get('PDF_PAGE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+
+page_cache = ResultCache(
+    app.config['PDF_PAGE_CACHE_FOLDER'],
+    max_bytes=app.config['PDF_PAGE_CACHE_MAX_BYTES'],
+    ttl=app.config['RESULT_CACHE_TTL']
+)
+
+# OCR con Tesseract para las páginas escaneadas (sin capa de texto)
+app.config['OCR_ENABLED'] = os.environ.get('OCR_ENABLED', '1') == '1'  # Sólo si el binario está instalado
+app.config['OCR_COMMAND'] = os.environ.get('OCR_COMMAND', 'tesseract')
+app.config['OCR_LANG'] = os.environ.get('OCR_LANG', 'spa')
+# Resoluciones a probar, de menor a mayor, hasta que los números superen OCR_MIN_CONFIDENCE
+app.config['OCR_DPI_STEPS'] = [int(dpi) for dpi in os.environ.get('OCR_DPI_STEPS', '150,300').split(',')]
+app.config['OCR_MIN_CONFIDENCE'] = float(os.environ.get('OCR_MIN_CONFIDENCE', 80))
+app.config['OCR_WORKERS'] = int(os.environ.get('OCR_WORKERS', cpu_share()))
+app.config['OCR_CACHE_FOLDER'] = os.environ.get('OCR_CACHE_FOLDER', os.path.join(app.config['RESULT_CACHE_FOLDER'], 'ocr'))
+app.config['OCR_CACHE_MAX_BYTES'] = int(os.environ.get('OCR_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+ocr_engine = ocr.OcrEngine(
+    command=app.config['OCR_COMMAND'],
+    lang=app.config['OCR_LANG'],
+    dpi_steps=app.config['OCR_DPI_STEPS'],
+    min_confidence=app.config['OCR_MIN_CONFIDENCE'],
+    workers=app.config['OCR_WORKERS'],
+    cache=ResultCache(
+        app.config['OCR_CACHE_FOLDER'],
+        max_bytes=app.config['OCR_CACHE_MAX_BYTES'],
+        ttl=app.config['RESULT_CACHE_TTL']
+    )
+)
+
+# Limpieza en segundo plano de las carpetas de trabajo de tmp/
+app.config['TMP_MAX_AGE'] = int(os.environ.get('TMP_MAX_AGE', 3600))  # Segundos antes de borrar
+app.config['TMP_REAP_INTERVAL'] = int(os.environ.get('TMP_REAP_INTERVAL', 300))
+reaper_pid = None
+
+def spooled_buffer():
+    """Buffer en memoria que pasa a un archivo de tmp/ si supera SPOOL_MAX_SIZE"""
+    return tempfile.SpooledTemporaryFile(max_size=app.config['SPOOL_MAX_SIZE'], dir=app.config['UPLOAD_FOLDER'])
+
+def iter_buffer(buffer, chunk_size=64 * 1024):
+    try:
+        for chunk in iter(lambda: buffer.read(chunk_size), b''):
+            yield chunk
+    finally:
+        buffer.close()
+
+def open_pdf(source):
+    """pdfplumber.open que además acepta los bytes del PDF"""
+    return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+@contextmanager
+def pool_source(source):
+    """El PDF para otro proceso: la ruta, los bytes si entra en SPOOL_MAX_SIZE o una copia en tmp/"""
+    if isinstance(source, (str, os.PathLike, bytes)):
+        yield source
+        return
+    size = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    if size <= app.config['SPOOL_MAX_SIZE']:
+        data = source.read()
+        source.seek(0)
+        yield data
+        return
+    with tempfile.NamedTemporaryFile(dir=app.config['UPLOAD_FOLDER'], suffix='.pdf') as spilled:
+        shutil.copyfileobj(source, spilled)
+        spilled.flush()
+        source.seek(0)
+        yield spilled.name
+
+def spill_output(output):
+    """Documento generado para devolver a otro proceso: los bytes o, si supera
+    SPOOL_MAX_SIZE, la ruta de un archivo en tmp/ (ver open_output)"""
+    data = output.getvalue()
+    if len(data) <= app.config['SPOOL_MAX_SIZE']:
+        return data
+    fd, path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.out')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+def open_output(result):
+    """Archivo abierto con un resultado de spill_output; el de tmp/ se borra enseguida"""
+    if isinstance(result, bytes):
+        return io.BytesIO(result)
+    f = open(result, 'rb')
+    os.unlink(result)
+    return f
+
+def send_buffer(buffer, download_name, mimetype):
+    """Envía un buffer desde el principio sin escribirlo a disco"""
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    response = Response(iter_buffer(buffer), mimetype=mimetype)
+    response.content_length = size
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return response
+
+def cleanup_old_files(max_age):
+    """Limpia archivos temporales con más de max_age segundos sin modificarse"""
+    limit = time.time() - max_age
+    for entry in os.scandir(app.config['UPLOAD_FOLDER']):
         try:
-            if os.path.isfile(filepath):
-                os.unlink(filepath)
-            elif os.path.isdir(filepath):
-                shutil.rmtree(filepath)
+            if entry.stat().st_mtime >= limit:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
         except Exception as e:
-            print(f"Error limpiando archivo {filepath}: {e}")
-
-def process_pdf(pdf_path):
-    import re
-    import pdfplumber
-    import pandas as pd
-
-    with pdfplumber.open(pdf_path) as pdf:
-        # Extract all tables from all pages
-        all_tables = []
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            if tables:
-                all_tables.extend(tables)
-        
-        if not all_tables:
-            raise ValueError("No se encontraron tablas en el PDF")
+            print(f"Error limpiando archivo {entry.path}: {e}")
+
+def reap_forever():
+    while True:
+        time.sleep(app.config['TMP_REAP_INTERVAL'])
+        cleanup_old_files(app.config['TMP_MAX_AGE'])
+
+@app.before_request
+def start_reaper():
+    # Un hilo por proceso; se verifica el pid porque los workers de gunicorn son forks
+    global reaper_pid
+    if reaper_pid != os.getpid():
+        reaper_pid = os.getpid()
+        threading.Thread(target=reap_forever, name='tmp-reaper', daemon=True).start()
+
+def release_page(page):
+    """Libera los objetos cacheados de una página ya procesada"""
+    if hasattr(page, 'close'):
+        page.close()
+    else:
+        # pdfplumber < 0.11 no tiene Page.close()
+        page.flush_cache()
+        page.get_textmap.cache_clear()
+
+def reflow_rows(df_data, header):
+    """Expande las celdas con varias líneas en filas, sin desalinear las columnas.
+    
+    Cada fila de la tabla ocupa tantas filas como líneas tenga su celda más
+    larga; las celdas más cortas se completan con ''. Las líneas vacías y
+    las celdas None se descartan.
+    """
+    # Lista de líneas no vacías de cada celda
+    lines = df_data.fillna('').astype(str).apply(lambda column: column.str.findall(r'[^\n]*\S[^\n]*'))
+    counts = lines.apply(lambda column: column.str.len()).to_numpy()
+    row_sizes = counts.max(axis=1) if counts.size else np.zeros(len(lines), dtype=int)
+    row_offsets = np.cumsum(row_sizes) - row_sizes
+    
+    result = np.full((int(row_sizes.sum()), lines.shape[1]), '', dtype=object)
+    for col in range(lines.shape[1]):
+        values = lines.iloc[:, col].reset_index(drop=True).explode().dropna()
+        positions = values.groupby(level=0).cumcount().to_numpy()
+        result[row_offsets[values.index.to_numpy()] + positions, col] = values.str.strip().to_numpy()
+    
+    return pd.DataFrame(result, columns=header)
+
+def process_pdf(source):
+    """Extrae la cotización de un PDF; source es una ruta, un archivo abierto o sus bytes"""
+    all_tables, page_texts, profile = extract_pages(source)
+    columns = profile['columns'] if profile else layouts.DEFAULT_COLUMNS
+    with metrics.stage('compute'):
+        df_result, resumen_df = build_quote(all_tables, page_texts, columns)
+    metrics.count(rows=len(df_result))
+    return df_result, resumen_df
+
+def extract_pages(source):
+    """Recorre el PDF una sola vez y devuelve (tablas, texto de cada página, perfil del layout)"""
+    # Dentro de un pool (lotes, trabajos) se extrae en serie para no anidar procesos;
+    # el hijo del sandbox atiende un solo PDF y sí usa el pool de extracción
+    if (app.config['PARALLEL_EXTRACTION'] and app.config['EXTRACT_WORKERS'] > 1
+            and (multiprocessing.parent_process() is None or sandbox.in_child())):
+        profile, layout_from = None, 0
+        with open_pdf(source) as pdf:
+            page_count = len(pdf.pages)
+            # Todos los rangos tienen que usar el mismo perfil: se busca antes de repartirlos
+            if page_count >= app.config['PARALLEL_EXTRACTION_MIN_PAGES'] and app.config['LAYOUTS_ENABLED']:
+                with metrics.stage('layout_lookup'):
+                    layout_from, profile = detect_layout(pdf)
+        if page_count >= app.config['PARALLEL_EXTRACTION_MIN_PAGES']:
+            with metrics.stage('extract_parallel'), pool_source(source) as pdf:
+                all_tables, page_texts, counts = extract_pages_parallel(pdf, page_count, profile, layout_from)
+            metrics.count(pages=page_count, skipped_table_pages=counts[0], skipped_text_pages=counts[1],
+                          ocr_pages=counts[2])
+            return all_tables, page_texts, profile
+    
+    tables_timer = metrics.StageTimer('extract_tables')
+    text_timer = metrics.StageTimer('extract_text')
+    all_tables, page_texts, counts, profile = extract_page_range(
+        source, 0, None, tables_timer, text_timer, find_layout=app.config['LAYOUTS_ENABLED']
+    )
+    metrics.count(pages=len(page_texts), skipped_table_pages=counts[0], skipped_text_pages=counts[1],
+                  ocr_pages=counts[2])
+    tables_timer.record()
+    text_timer.record()
+    return all_tables, page_texts, profile
+
+def detect_layout(pdf):
+    """(número de la primera página con encabezado de tabla, entre las primeras
+    LAYOUT_SCAN_PAGES, y su perfil o None si no está registrado)"""
+    for number, page in enumerate(pdf.pages[:app.config['LAYOUT_SCAN_PAGES']]):
+        found, profile = page_layout(page)
+        release_page(page)
+        if found:
+            return number, profile
+    return 0, None
+
+def page_layout(page):
+    """(la página tiene encabezado de tabla, perfil registrado para ese encabezado o None).
+    
+    Si el layout no está registrado se usa la detección genérica y, con
+    LAYOUT_LEARN, se registra para los próximos PDFs del mismo proveedor.
+    """
+    words = layouts.header_words(page)
+    if not words:
+        return False, None
+    key = layouts.fingerprint(words)
+    profile = layout_registry.get(key)
+    metrics.increment('layout_misses' if profile is None else 'layout_hits')
+    if profile is None and app.config['LAYOUT_LEARN']:
+        learned = layouts.learn_profile(page, key)
+        if learned is not None:
+            layout_registry.add(key, learned)
+    return True, profile
+
+def classify_page(page):
+    """Rasgos baratos de una página: (puede tener tablas, puede tener totales).
+    
+    Sólo mira los caracteres y los bordes ya parseados, sin armar la grilla
+    de la tabla ni el texto con layout.
+    """
+    text = ''.join(char['text'] for char in page.chars)
+    if len(text.strip()) < app.config['PREFILTER_MIN_CHARS']:
+        return False, False
+    
+    # La estrategia por líneas de extract_tables necesita al menos dos bordes en cada dirección
+    horizontal = len(page.horizontal_edges)
+    vertical = len(page.vertical_edges)
+    if horizontal < 2 or vertical < 2:
+        table_candidate = False
+    elif any(keyword in text for keyword in layouts.HEADER_KEYWORDS):
+        table_candidate = True
+    else:
+        table_candidate = horizontal + vertical >= app.config['PREFILTER_MIN_RULINGS']
+    totals_candidate = any(keyword in text for keyword in TOTALS_KEYWORDS)
+    return table_candidate, totals_candidate
+
+def extract_page_range(source, start, end, tables_timer=None, text_timer=None, profile=None, find_layout=False,
+                       layout_from=0):
+    """Tablas y texto de las páginas [start, end), en orden, los conteos (páginas
+    sin búsqueda de tablas, sin búsqueda de totales, leídas con OCR) y el perfil.
+    
+    El perfil se aplica desde la página layout_from (la del encabezado). Con
+    find_layout se busca en la primera página con encabezado de tabla (entre
+    las primeras LAYOUT_SCAN_PAGES), reusando la página ya parseada, igual
+    que detect_layout en la extracción en paralelo.
+    """
+    tables_timer = tables_timer or metrics.StageTimer('extract_tables')
+    text_timer = text_timer or metrics.StageTimer('extract_text')
+    layout_timer = metrics.StageTimer('layout_lookup')
+    prefilter = app.config['PAGE_PREFILTER']
+    use_ocr = app.config['OCR_ENABLED'] and ocr_engine.available()
+    scan_end = app.config['LAYOUT_SCAN_PAGES'] if find_layout else 0
+    
+    with open_pdf(source) as pdf:
+        page_tables = []
+        page_texts = []
+        scanned = []
+        skipped_tables = skipped_text = 0
+        for number, page in enumerate(pdf.pages[start:end], start):
+            # Las páginas escaneadas se leen juntas con OCR al final del rango
+            if use_ocr and not page.chars and page.images:
+                scanned.append((len(page_texts), number, page))
+                page_tables.append([])
+                page_texts.append('')
+                continue
+            
+            if number < scan_end:
+                with layout_timer:
+                    found, profile = page_layout(page)
+                if found:
+                    scan_end = 0
+                    layout_from = number
+            page_profile = profile if number >= layout_from else None
+            
+            table_candidate, totals_candidate = classify_page(page) if prefilter else (True, True)
+            
+            if table_candidate:
+                with tables_timer:
+                    tables = layouts.extract_tables(page, page_profile) if page_profile else page.extract_tables()
+                page_tables.append(tables or [])
+            else:
+                page_tables.append([])
+                skipped_tables += 1
             
-        # Combine all tables
-        raw_table = []
-        headers = all_tables[0][0]  # Get headers from first table
-        raw_table.append(headers)
+            # Las páginas sin totales aportan texto vacío para no correr la búsqueda
+            if totals_candidate:
+                with text_timer:
+                    page_texts.append(page.extract_text())
+            else:
+                page_texts.append('')
+                skipped_text += 1
+            release_page(page)
+        
+        if scanned:
+            with metrics.stage('ocr'):
+                page_words = ocr_engine.read_pages([page for _, _, page in scanned])
+            for (position, number, page), words in zip(scanned, page_words):
+                page_profile = profile if profile and number >= layout_from else None
+                columns = page_profile['columns'] if page_profile else layouts.DEFAULT_COLUMNS
+                vertical_lines = page_profile['vertical_lines'] if page_profile else None
+                page_tables[position], page_texts[position] = ocr.words_to_quote(words, columns, vertical_lines)
+                release_page(page)
+    
+    if find_layout:
+        layout_timer.record()
+    all_tables = [table for tables in page_tables for table in tables]
+    return all_tables, page_texts, (skipped_tables, skipped_text, len(scanned)), profile
+
+def extract_pages_parallel(pdf, page_count, profile=None, layout_from=0):
+    """Reparte rangos de páginas entre procesos y une los resultados en orden de página"""
+    # Más rangos que procesos para repartir mejor las páginas más pesadas
+    chunk_size = -(-page_count // (app.config['EXTRACT_WORKERS'] * 2))
+    starts = range(0, page_count, chunk_size)
+    ends = [min(start + chunk_size, page_count) for start in starts]
+    
+    all_tables = []
+    page_texts = []
+    counts = [0, 0, 0]
+    executor, futures = extract_pool.submit_all(
+        [(extract_page_range, (pdf, start, end, None, None, profile, False, layout_from))
+         for start, end in zip(starts, ends)]
+    )
+    try:
+        for future in futures:
+            tables, texts, range_counts, _ = future.result()
+            all_tables.extend(tables)
+            page_texts.extend(texts)
+            counts = [total + count for total, count in zip(counts, range_counts)]
+    except BudgetExceeded:
+        # Venció el plazo del sandbox: los rangos en curso no se esperan
+        extract_pool.discard(executor, kill=True)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        if sandbox.in_child():
+            # El hijo del sandbox no deja procesos vivos entre un PDF y otro
+            # (al salir, multiprocessing esperaría a los del pool, que siguen ociosos)
+            extract_pool.discard(executor)
+    return all_tables, page_texts, counts
+
+def build_quote(all_tables, page_texts, columns=layouts.DEFAULT_COLUMNS):
+    """Arma df_result y resumen_df a partir de las tablas y el texto extraídos.
+    
+    columns mapea el nombre interno de cada columna al encabezado del proveedor.
+    """
+    if not all_tables:
+        raise ValueError("No se encontraron tablas en el PDF")
         
-        # Add data rows from all tables
-        for table in all_tables:
-            # Skip header row if it's not the first table
-            start_idx = 1 if table[0] == headers else 0
-            raw_table.extend(table[start_idx:])
-
-        # Convert to DataFrame
-        df_raw = pd.DataFrame(raw_table)
-
-        # Process headers
-        header = df_raw.iloc[0].tolist()
-        df_data = df_raw.iloc[1:].reset_index(drop=True)
-
-        # Process data into lists
-        lists = []
-        for col in range(df_data.shape[1]):
-            values = '\n'.join(df_data.iloc[:, col].values)
-            values_list = [x.strip() for x in values.strip().split('\n') if x.strip() != '']
-            lists.append(values_list)
-
-        # Get maximum rows
-        n_rows = max(len(l) for l in lists)
-
-        # Fill shorter lists
-        lists = [l + ['']*(n_rows-len(l)) for l in lists]
-
-        # Create final DataFrame
-        df_final = pd.DataFrame({header[i]: lists[i] for i in range(len(header))})
-
-        # Extract totals using regex
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
-
-        # Patrón regex para encontrar los totales
-        pattern = r'(Subtotal Cotización|Bonificación|Subtotal Neto|IVA|Total Cotización)\s*:\s*([\d.,]+)'
-        matches = re.findall(pattern, text)
-
-        # Convertimos los resultados en diccionario
-        resultados = {label: float(valor.replace(',', '').replace('.', '', valor.count('.')-1)) for label, valor in matches}
-
-        # Calcular porcentaje de bonificación correctamente
-        if "Bonificación" in resultados and "Subtotal Cotización" in resultados:
-            try:
-                pct_bonificacion = resultados["Bonificación"] / resultados["Subtotal Cotización"]
-            except ZeroDivisionError:
-                pct_bonificacion = 0
-        else:
+    # Combine all tables
+    raw_table = []
+    headers = all_tables[0][0]  # Get headers from first table
+    raw_table.append(headers)
+    
+    # Add data rows from all tables
+    for table in all_tables:
+        # Skip header row if it's not the first table
+        start_idx = 1 if table[0] == headers else 0
+        raw_table.extend(table[start_idx:])
+
+    # Convert to DataFrame
+    df_raw = pd.DataFrame(raw_table)
+
+    # Process headers
+    header = df_raw.iloc[0].tolist()
+    df_data = df_raw.iloc[1:].reset_index(drop=True)
+
+    # Expandir las celdas multilínea manteniendo alineadas las filas
+    df_final = reflow_rows(df_data, header)
+    df_final = df_final.rename(columns={supplier: name for name, supplier in columns.items()})
+
+    # Extract totals using regex
+    text = "".join(page_text + "\n" for page_text in page_texts)
+
+    # Patrón regex para encontrar los totales
+    pattern = r'(Subtotal Cotización|Bonificación|Subtotal Neto|IVA|Total Cotización)\s*:\s*([\d.,]+)'
+    matches = re.findall(pattern, text)
+
+    # Formato de los números (1,234.56 o 1.234,56) detectado una vez para todo el documento
+    labels = [label for label, _ in matches]
+    valores = [valor for _, valor in matches]
+    numeric_columns = [df_final[column] for column in ("Cantidad", "Precio Unit", "% Desc.", "% IVA", "Importe")]
+    decimal = amounts.detect_decimal(valores, *numeric_columns)
+
+    # Convertimos los resultados en diccionario
+    resultados = dict(zip(labels, amounts.parse_numbers(valores, decimal).tolist()))
+
+    # Calcular porcentaje de bonificación correctamente
+    if "Bonificación" in resultados and "Subtotal Cotización" in resultados:
+        try:
+            pct_bonificacion = resultados["Bonificación"] / resultados["Subtotal Cotización"]
+        except ZeroDivisionError:
             pct_bonificacion = 0
+    else:
+        pct_bonificacion = 0
+
+    # Convert numeric columns
+    df_final["Cantidad"] = amounts.parse_numbers(df_final["Cantidad"], decimal)
+    df_final["Precio_Unit"] = amounts.parse_numbers(df_final["Precio Unit"], decimal)
+    df_final["% Desc."] = amounts.parse_numbers(df_final["% Desc."], decimal).fillna(0)
+    df_final["% IVA"] = amounts.parse_numbers(df_final["% IVA"], decimal).fillna(0)
+    df_final["Importe"] = amounts.parse_numbers(df_final["Importe"], decimal).fillna(0)
+
+    # Calcular Precio Lista (sin bonificación ni descuento)
+    df_final["Precio_Lista"] = df_final["Cantidad"] * df_final["Precio_Unit"]
 
-        # Convert numeric columns
-        df_final["Cantidad"] = pd.to_numeric(df_final["Cantidad"], errors="coerce")
-        df_final["Precio_Unit"] = pd.to_numeric(df_final["Precio Unit"], errors="coerce")
-        df_final["% Desc."] = pd.to_numeric(df_final["% Desc."], errors="coerce").fillna(0)
-        df_final["% IVA"] = pd.to_numeric(df_final["% IVA"], errors="coerce").fillna(0)
-        df_final["Importe"] = pd.to_numeric(df_final["Importe"], errors="coerce").fillna(0)
+    # Calcular Precio Neto (aplicando bonificación sobre el precio con descuento)
+    df_final["Precio Neto"] = df_final["Importe"] * (1 - pct_bonificacion)
 
-        # Calcular Precio Lista (sin bonificación ni descuento)
-        df_final["Precio_Lista"] = df_final["Cantidad"] * df_final["Precio_Unit"]
+    # Calcular Precio Neto Unitario
+    df_final["Precio Neto Unitario"] = df_final["Precio Neto"] / df_final["Cantidad"]
 
-        # Calcular Precio Neto (aplicando bonificación sobre el precio con descuento)
-        df_final["Precio Neto"] = df_final["Importe"] * (1 - pct_bonificacion)
+    # Calcular IVA: Precio Neto * (%IVA/100)
+    df_final["IVA Calculado"] = df_final["Precio Neto"] * (df_final["% IVA"] / 100)
 
-        # Calcular Precio Neto Unitario
-        df_final["Precio Neto Unitario"] = df_final["Precio Neto"] / df_final["Cantidad"]
+    # Calcular Precio con Impuestos
+    df_final["Precio con Impuestos"] = df_final["Precio Neto"] + df_final["IVA Calculado"]
 
-        # Calcular IVA: Precio Neto * (%IVA/100)
-        df_final["IVA Calculado"] = df_final["Precio Neto"] * (df_final["% IVA"] / 100)
+    # Para mostrar en la tabla, el precio unitario neto
+    df_final["Precio"] = df_final["Precio Neto Unitario"]
 
-        # Calcular Precio con Impuestos
-        df_final["Precio con Impuestos"] = df_final["Precio Neto"] + df_final["IVA Calculado"]
+    # Calcular Subtotal: suma de Precio Neto
+    subtotal = round(pd.to_numeric(df_final["Precio Neto"], errors="coerce").sum(), 4)
 
-        # Para mostrar en la tabla, el precio unitario neto
-        df_final["Precio"] = df_final["Precio Neto Unitario"]
+    # Calcular IVA por tipo
+    precio_neto_21 = pd.to_numeric(df_final.loc[df_final["% IVA"] == 21, "Precio Neto"].replace("", 0), errors="coerce").fillna(0)
+    iva_21 = round((precio_neto_21 * 0.21).sum(), 4)
+    precio_neto_105 = pd.to_numeric(df_final.loc[df_final["% IVA"] == 10.5, "Precio Neto"].replace("", 0), errors="coerce").fillna(0)
+    iva_105 = round((precio_neto_105 * 0.105).sum(), 4)
 
-        # Calcular Subtotal: suma de Precio Neto
-        subtotal = round(pd.to_numeric(df_final["Precio Neto"], errors="coerce").sum(), 4)
+    # Calcular Total: suma de Precio con Impuestos
+    total = round(pd.to_numeric(df_final["Precio con Impuestos"], errors="coerce").sum(), 4)
 
-        # Calcular IVA por tipo
-        precio_neto_21 = pd.to_numeric(df_final.loc[df_final["% IVA"] == 21, "Precio Neto"].replace("", 0), errors="coerce").fillna(0)
-        iva_21 = round((precio_neto_21 * 0.21).sum(), 4)
-        precio_neto_105 = pd.to_numeric(df_final.loc[df_final["% IVA"] == 10.5, "Precio Neto"].replace("", 0), errors="coerce").fillna(0)
-        iva_105 = round((precio_neto_105 * 0.105).sum(), 4)
+    # Crear DataFrame resumen
+    resumen_df = pd.DataFrame({
+        "Concepto": ["Subtotal", "IVA 21%", "IVA 10.5%", "Total"],
+        "Importe": [subtotal, iva_21, iva_105, total]
+    })
 
-        # Calcular Total: suma de Precio con Impuestos
-        total = round(pd.to_numeric(df_final["Precio con Impuestos"], errors="coerce").sum(), 4)
+    # Crear DataFrame de resultado final
+    df_result = df_final[["Descripción Artículo", "Desc. Adicional", "Cantidad", "Precio", "% IVA", "Precio Neto"]].copy()
+    df_result["Cantidad"] = df_result["Cantidad"].round(4)
+    df_result["Precio"] = df_result["Precio"].round(4)
+    df_result["% IVA"] = df_result["% IVA"].round(4)
+    df_result["Precio Neto"] = df_result["Precio Neto"].round(4)
 
-        # Crear DataFrame resumen
-        resumen_df = pd.DataFrame({
-            "Concepto": ["Subtotal", "IVA 21%", "IVA 10.5%", "Total"],
-            "Importe": [subtotal, iva_21, iva_105, total]
-        })
+    return df_result, resumen_df
 
-        print(pct_bonificacion)
-        # Crear DataFrame de resultado final
-        df_result = df_final[["Descripción Artículo", "Desc. Adicional", "Cantidad", "Precio", "% IVA", "Precio Neto"]].copy()
-        df_result["Cantidad"] = df_result["Cantidad"].round(4)
-        df_result["Precio"] = df_result["Precio"].round(4)
-        df_result["% IVA"] = df_result["% IVA"].round(4)
-        df_result["Precio Neto"] = df_result["Precio Neto"].round(4)
+# Cambiar al modificar la extracción, para no reusar resultados de la caché
+EXTRACTION_VERSION = '1'
 
-        return df_result, resumen_df
+# Configuración que cambia el resultado de la extracción y por lo tanto la clave de la caché
+EXTRACTION_SETTINGS = (
+    'PAGE_PREFILTER', 'PREFILTER_MIN_CHARS', 'PREFILTER_MIN_RULINGS',
+    'LAYOUTS_ENABLED', 'LAYOUTS_FILE', 'LAYOUT_SCAN_PAGES',
+    'OCR_ENABLED', 'OCR_LANG', 'OCR_DPI_STEPS', 'OCR_MIN_CONFIDENCE',
+)
 
-def generate_excel(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
-    # Create Excel file in our tmp directory
-    excel_filename = f"temp_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    excel_path = os.path.join(app.config['UPLOAD_FOLDER'], excel_filename)
+def extraction_key(source):
+    """Clave de la caché: hash del PDF más EXTRACTION_VERSION y EXTRACTION_SETTINGS"""
+    settings = {name: app.config[name] for name in EXTRACTION_SETTINGS}
+    # Sin el binario de Tesseract las páginas escaneadas quedan vacías
+    settings['OCR_AVAILABLE'] = ocr_engine.available()
+    salt = hashlib.sha256(json.dumps([EXTRACTION_VERSION, settings], sort_keys=True).encode()).hexdigest()
+    return f'{file_digest(source)}-{salt[:16]}'
+
+def extract_quote(source):
+    """Devuelve (df_result, resumen_df), reutilizando la caché si el PDF ya fue procesado"""
+    if not app.config['RESULT_CACHE_ENABLED']:
+        return run_extraction(source)
     
-    # Write to Excel with formatting
-    with pd.ExcelWriter(excel_path, engine="xlsxwriter") as writer:
-        workbook = writer.book
-        worksheet = workbook.add_worksheet('Hoja1')
-        
-        # Ocultar líneas de grilla
-        worksheet.hide_gridlines(2)  # Ocultar líneas de grilla en pantalla e impresión
-        
-        # Configurar altura de filas para el header
-        worksheet.set_row(0, 35)  # Altura aumentada para el texto más grande
-        worksheet.set_row(1, 45)  # Altura aumentada para el logo más grande
-        
-        # Crear franja azul para el header
-        header_bg_format = workbook.add_format({
-            'bg_color': '#14324B'
-        })
-        
-        # Aplicar fondo azul a las primeras dos filas
-        for col in range(12):  # A hasta L
-            worksheet.write(0, col, '', header_bg_format)
-            worksheet.write(1, col, '', header_bg_format)
-        
-        # Crear header con el nombre de la empresa y cotización
-        # Formato para el nombre de la empresa
-        company_name_format = workbook.add_format({
-            'bold': True,
-            'font_size': 28,  # Tamaño más grande para el nombre
-            'font_name': 'Montserrat',  # Tipografía más moderna
-            'align': 'center',
-            'valign': 'vcenter',
-            'font_color': 'white',
-            'bg_color': '#14324B'
-        })
-        
-        # Formato para "Cotización"
-        subtitle_format = workbook.add_format({
-            'font_size': 16,  # Tamaño más pequeño para el subtítulo
-            'font_name': 'Montserrat',
-            'align': 'center',
-            'valign': 'vcenter',
-            'font_color': 'white',
-            'bg_color': '#14324B'
-        })
-        
-        # Insertar textos
-        worksheet.merge_range('A1:L1', 'Acquatrade Sudamericana S.A', company_name_format)
-        worksheet.merge_range('A2:L2', 'Cotización', subtitle_format)
-        
-        # Configurar anchos de columna uniformes después del logo
-        worksheet.set_column('A:L', 15)    # Todas las columnas con el mismo ancho
-        
-        # Formats para la tabla (con bordes)
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#14324B',
-            'font_color': 'white',
-            'border': 1,
-            'align': 'center',
-            'valign': 'vcenter',
-            'text_wrap': True
-        })
-        
-        cell_format = workbook.add_format({
-            'border': 1,
-            'align': 'left',
-            'valign': 'vcenter',
-            'text_wrap': True
-        })
-        
-        alt_row_format = workbook.add_format({
-            'border': 1,
-            'bg_color': '#F0F0F0',
-            'align': 'left',
-            'valign': 'vcenter',
-            'text_wrap': True
-        })
-        
-        # Formatos SIN bordes para información general
-        label_format = workbook.add_format({
-            'bold': True,
-            'align': 'left',
-            'valign': 'vcenter'
-        })
-        
-        value_format = workbook.add_format({
-            'align': 'left',
-            'valign': 'vcenter'
-        })
-        
-        total_label_format = workbook.add_format({
-            'bold': True,
-            'align': 'left',
-            'valign': 'vcenter'
-        })
-        
-        total_value_format = workbook.add_format({
-            'bold': True,
-            'align': 'right',
-            'valign': 'vcenter',
-            'num_format': '"$"#,##0.00" USD"'
-        })
-        
-        # Agregar espacio después del header
-        worksheet.set_row(2, 5)  # Fila vacía pequeña (después de las 2 filas del header)
-        worksheet.set_row(3, 5)  # Fila vacía pequeña
-        
-        # Client information (sin bordes, con mejor espaciado)
-        info_row = 4
-        worksheet.write(info_row, 0, 'Razón social:', label_format)
-        worksheet.write(info_row, 1, razon_social, value_format)
-        worksheet.write(info_row, 4, 'N° de cotiz:', label_format)
-        worksheet.write(info_row, 5, nro_cotizacion, value_format)
+    with metrics.stage('cache_lookup'):
+        key = extraction_key(source)
+        cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    df_result, resumen_df = run_extraction(source)
+    result_cache.put(key, (df_result, resumen_df))
+    return df_result, resumen_df
+
+def use_sandbox():
+    # Los pools de trabajos y lotes ya aíslan el procesamiento del worker web
+    return app.config['SANDBOX_ENABLED'] and multiprocessing.parent_process() is None
+
+def run_extraction(source):
+    """process_pdf, dentro del sandbox si está habilitado"""
+    if not use_sandbox():
+        return process_pdf(source)
+    with pool_source(source) as pdf:
+        return sandbox.run(sandboxed_extract, pdf, app.config['SANDBOX_MAX_PAGES'])
+
+def sandboxed_extract(pdf, max_pages):
+    """Se ejecuta en el sandbox: controla la cantidad de páginas antes de extraer"""
+    with open_pdf(pdf) as opened:
+        page_count = len(opened.pages)
+    if page_count > max_pages:
+        raise BudgetExceeded(f'El PDF tiene {page_count} páginas; el máximo es {max_pages}')
+    return process_pdf(pdf)
+
+@metrics.timed('render_excel')
+def generate_excel(df_result, resumen_df, razon_social, nro_cotizacion, fecha, cuit='', output=None):
+    """Escribe el Excel fila por fila en modo constant_memory y devuelve el buffer"""
+    if output is None:
+        output = io.BytesIO()
+    
+    # Anchos de columna calculados de una vez, antes de emitir filas:
+    # el mayor entre header y contenido, con un mínimo de 10 y máximo de 50
+    header_widths = df_result.columns.astype(str).str.len()
+    if len(df_result):
+        content_widths = df_result.astype(str).apply(lambda column: column.str.len().max()).to_numpy()
+    else:
+        content_widths = np.zeros(len(df_result.columns), dtype=int)
+    column_widths = np.clip(np.maximum(header_widths, content_widths) + 3, 10, 50)
+    
+    # En constant_memory las filas se escriben en orden y se liberan al avanzar
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Hoja1')
+    
+    # Ocultar líneas de grilla
+    worksheet.hide_gridlines(2)  # Ocultar líneas de grilla en pantalla e impresión
+    
+    # Configurar anchos de columna uniformes, luego los de la tabla
+    worksheet.set_column('A:L', 15)
+    for idx, width in enumerate(column_widths):
+        worksheet.set_column(idx, idx, int(width))
+    
+    # Formats del header
+    header_bg_format = workbook.add_format({
+        'bg_color': '#14324B'
+    })
+    
+    # Formato para el nombre de la empresa
+    company_name_format = workbook.add_format({
+        'bold': True,
+        'font_size': 28,  # Tamaño más grande para el nombre
+        'font_name': 'Montserrat',  # Tipografía más moderna
+        'align': 'center',
+        'valign': 'vcenter',
+        'font_color': 'white',
+        'bg_color': '#14324B'
+    })
+    
+    # Formato para "Cotización"
+    subtitle_format = workbook.add_format({
+        'font_size': 16,  # Tamaño más pequeño para el subtítulo
+        'font_name': 'Montserrat',
+        'align': 'center',
+        'valign': 'vcenter',
+        'font_color': 'white',
+        'bg_color': '#14324B'
+    })
+    
+    # Formats para la tabla (con bordes)
+    header_format = workbook.add_format({
+        'bold': True,
+        'bg_color': '#14324B',
+        'font_color': 'white',
+        'border': 1,
+        'align': 'center',
+        'valign': 'vcenter',
+        'text_wrap': True
+    })
+    
+    cell_format = workbook.add_format({
+        'border': 1,
+        'align': 'left',
+        'valign': 'vcenter',
+        'text_wrap': True
+    })
+    
+    alt_row_format = workbook.add_format({
+        'border': 1,
+        'bg_color': '#F0F0F0',
+        'align': 'left',
+        'valign': 'vcenter',
+        'text_wrap': True
+    })
+    
+    # Formatos SIN bordes para información general
+    label_format = workbook.add_format({
+        'bold': True,
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    
+    value_format = workbook.add_format({
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    
+    total_label_format = workbook.add_format({
+        'bold': True,
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    
+    total_value_format = workbook.add_format({
+        'bold': True,
+        'align': 'right',
+        'valign': 'vcenter',
+        'num_format': '"$"#,##0.00" USD"'
+    })
+    
+    condition_format = workbook.add_format({
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    
+    condition_title_format = workbook.add_format({
+        'bold': True,
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    
+    # En constant_memory una fila sólo se escribe si tiene alguna celda: los
+    # espaciadores llevan una celda vacía con formato para conservar su alto
+    spacer_format = workbook.add_format()
+    
+    def spacer(row, height=None):
+        if height is not None:
+            worksheet.set_row(row, height)
+        worksheet.write_blank(row, 0, None, spacer_format)
+    
+    # Franja azul del header con el nombre de la empresa y "Cotización"
+    worksheet.set_row(0, 35)  # Altura aumentada para el texto más grande
+    worksheet.merge_range('A1:L1', 'Acquatrade Sudamericana S.A', company_name_format)
+    worksheet.set_row(1, 45)  # Altura aumentada para el logo más grande
+    worksheet.merge_range('A2:L2', 'Cotización', subtitle_format)
+    
+    # Agregar espacio después del header
+    spacer(2, 5)  # Fila vacía pequeña (después de las 2 filas del header)
+    spacer(3, 5)  # Fila vacía pequeña
+    
+    # Client information (sin bordes, con mejor espaciado)
+    info_row = 4
+    worksheet.write(info_row, 0, 'Razón social:', label_format)
+    worksheet.write(info_row, 1, razon_social, value_format)
+    worksheet.write(info_row, 4, 'N° de cotiz:', label_format)
+    worksheet.write(info_row, 5, nro_cotizacion, value_format)
+    
+    worksheet.write(info_row + 1, 0, 'CUIT:', label_format)
+    worksheet.write(info_row + 1, 1, cuit, value_format)
+    worksheet.write(info_row + 1, 4, 'Fecha:', label_format)
+    worksheet.write(info_row + 1, 5, fecha, value_format)
+    
+    # Agregar más espacio antes de la tabla
+    spacer(6, 10)  # Fila vacía antes de la tabla
+    
+    # Start table at row 8 (ajustado por el nuevo header)
+    start_row = 8
+    
+    # Write column headers
+    worksheet.write_row(start_row - 1, 0, df_result.columns, header_format)
+    
+    # Write data with alternating row colors (solo la tabla tiene bordes);
+    # los NaN se escriben como celdas vacías
+    rows = df_result.astype(object).where(df_result.notna(), None).values
+    for row_idx, row in enumerate(rows):
+        row_format = alt_row_format if row_idx % 2 else cell_format
+        worksheet.set_row(start_row + row_idx, 20)  # Altura mínima para texto
+        worksheet.write_row(start_row + row_idx, 0, row, row_format)
+    
+    # Agregar espacio después de la tabla
+    spacer(start_row + len(df_result), 10)
+    spacer(start_row + len(df_result) + 1)
+    
+    # Calcular posición para totales (lado derecho)
+    total_start_col = len(df_result.columns) - 2  # Dos columnas desde la derecha
+    total_row = start_row + len(df_result) + 2
+    
+    # Write totals en el lado derecho (sin bordes)
+    for idx, (concepto, importe) in enumerate(resumen_df.values):
+        worksheet.write(total_row + idx, total_start_col, concepto, total_label_format)
+        worksheet.write(total_row + idx, total_start_col + 1, importe, total_value_format)
+    
+    # Agregar espacio antes de las condiciones
+    conditions_row = total_row + len(resumen_df) + 2
+    spacer(conditions_row - 2)
+    spacer(conditions_row - 1)
+    for idx, condition in enumerate(CONDITIONS):
+        format_to_use = condition_title_format if idx == 0 else condition_format
+        worksheet.write(conditions_row + idx, 0, condition, format_to_use)
+    
+    workbook.close()
+    output.seek(0)
+    return output
+
+# Layout de la tabla del PDF, en unidades de los ejes (10 x 12 por página)
+PDF_HEADERS = ['Descripción Artículo', 'Desc. Adicional', 'Cantidad', 'Precio', '% IVA', 'Precio Neto']
+PDF_COL_WIDTHS = [3.0, 2.0, 1.0, 1.0, 0.8, 1.2]
+PDF_COL_STARTS = [0.5, 3.5, 5.5, 6.5, 7.5, 8.3]
+PDF_HEADER_HEIGHT = 0.3
+PDF_ROW_HEIGHT = 0.25  # Reduced for more compact rows
+PDF_TABLE_Y = 9.2
+PDF_ROWS_PER_PAGE = 30  # Aumentado para más items por página
+
+CONDITIONS = [
+    "Condiciones comerciales:",
+    "• Validez de la presente cotización: 3 días corridos.",
+    "• Precios expresados en dólares.",
+    "• Forma de pago: a convenir.",
+    "• Entrega: sujeta a disponibilidad de stock."
+]
+
+# Escala de una unidad de los ejes en puntos, igual a la figura A4 de matplotlib
+# (los ejes ocupan 77.5% x 77% de 8.3 x 11.7 pulgadas)
+PDF_UNIT_X = 0.775 * 8.3 * 72 / 10
+PDF_UNIT_Y = 0.77 * 11.7 * 72 / 12
+PDF_PAD = 0.1 * 72  # Equivalente a pad_inches de bbox_inches='tight'
+
+def pdf_cell_text(value, width):
+    """Texto de una celda, recortado según el ancho de la columna"""
+    text_value = str(value) if pd.notna(value) else ""
+    if len(text_value) > int(width * 12):  # Aumentado para más caracteres
+        text_value = text_value[:int(width * 12)-3] + "..."
+    return text_value
+
+def generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output_folder=None, renderer=None):
+    # Create PDF file in our tmp directory (or the given folder)
+    pdf_filename = f"temp_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    pdf_path = os.path.join(output_folder or app.config['UPLOAD_FOLDER'], pdf_filename)
+    
+    with open(pdf_path, 'wb') as f:
+        write_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha, f, renderer=renderer)
+    
+    return pdf_path, pdf_filename
+
+def pdf_renderer(df_result, resumen_df, razon_social, nro_cotizacion, fecha, renderer=None):
+    """Renderer a usar: el nativo sólo escribe cp1252 (Helvetica estándar), así
+    que un texto con otros caracteres (por ejemplo 'ACME 日本') va por matplotlib"""
+    renderer = renderer or app.config['PDF_RENDERER']
+    if renderer == 'native':
+        texts = [razon_social, nro_cotizacion, fecha]
+        for df in (df_result, resumen_df):
+            texts.extend('\n'.join(df[column].astype(str)) for column in df.select_dtypes(include='object'))
+        if not encodable(*texts):
+            return 'matplotlib'
+    return renderer
+
+@metrics.timed('render_pdf')
+def write_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output, renderer=None):
+    """Escribe la cotización en un archivo abierto o buffer"""
+    # El renderer de matplotlib queda disponible para comparar resultados
+    if pdf_renderer(df_result, resumen_df, razon_social, nro_cotizacion, fecha, renderer) == 'matplotlib':
+        generate_pdf_matplotlib(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output)
+    else:
+        generate_pdf_native(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output)
+
+def render_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
+    """PDF de la cotización en un buffer, renderizado dentro del sandbox si está habilitado"""
+    if use_sandbox():
+        return open_output(sandbox.run(pdf_output, df_result, resumen_df, razon_social, nro_cotizacion, fecha))
+    output = spooled_buffer()
+    write_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output)
+    return output
+
+def pdf_output(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
+    output = io.BytesIO()
+    write_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output)
+    return spill_output(output)
+
+def excel_output(df_result, resumen_df, razon_social, nro_cotizacion, fecha, cuit=''):
+    return spill_output(generate_excel(df_result, resumen_df, razon_social, nro_cotizacion, fecha, cuit, output=io.BytesIO()))
+
+def render_both(df_result, resumen_df, razon_social, nro_cotizacion, fecha, cuit=''):
+    """(PDF, Excel) de la misma extracción, generados a la vez en procesos separados (ver open_output)"""
+    pdf_args = (df_result, resumen_df, razon_social, nro_cotizacion, fecha)
+    excel_args = pdf_args + (cuit,)
+    if use_sandbox():
+        return sandbox.run_many((pdf_output, pdf_args), (excel_output, excel_args))
+    if multiprocessing.parent_process() is not None:
+        return pdf_output(*pdf_args), excel_output(*excel_args)
+    
+    _, (pdf_future, excel_future) = render_pool.submit_all([(pdf_output, pdf_args), (excel_output, excel_args)])
+    return pdf_future.result(), excel_future.result()
+
+def generate_pdf_native(df_result, resumen_df, razon_social, nro_cotizacion, fecha, stream):
+    """Dibuja la cotización con operadores PDF directos, sin pasar por matplotlib"""
+    writer = PdfWriter(stream)
+    for width, height, contents in native_pages(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
+        writer.add_compressed_page(width, height, contents)
+    writer.close()
+
+def iter_pdf_native(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
+    """Genera los bytes del PDF de a una página, apenas cada una termina de dibujarse"""
+    timer = metrics.StageTimer('render_pdf')
+    buffer = ChunkBuffer()
+    with timer:
+        writer = PdfWriter(buffer)
+    yield buffer.drain()
+    
+    for width, height, contents in native_pages(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
+        with timer:
+            writer.add_compressed_page(width, height, contents)
+        yield buffer.drain()
+    
+    writer.close()
+    yield buffer.drain()
+    timer.record()
+
+# Cambiar al modificar el dibujo del cuerpo, para no reusar páginas de la caché
+PDF_BODY_VERSION = '1'
+
+def native_pages(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
+    """Páginas comprimidas (ancho, alto, streams): el cuerpo y, encima, los datos del cliente.
+    
+    Al volver a emitir la misma cotización para otro cliente sólo se dibuja
+    la franja con razón social, número y fecha; el cuerpo sale de la caché.
+    """
+    if not app.config['PDF_PAGE_CACHE_ENABLED']:
+        bodies = encode_body_pages(df_result, resumen_df)
+    else:
+        key = body_cache_key(df_result, resumen_df)
+        bodies = page_cache.get(key)
+        if bodies is None:
+            bodies = cache_body_pages(key, encode_body_pages(df_result, resumen_df))
+    
+    for width, height, body in bodies:
+        band = client_band(width, height, razon_social, nro_cotizacion, fecha)
+        yield width, height, [body, zlib.compress(band.content())]
+
+def body_cache_key(df_result, resumen_df):
+    """Hash del contenido de df_result y resumen_df (columnas y valores)"""
+    digest = hashlib.sha256(PDF_BODY_VERSION.encode())
+    for df in (df_result, resumen_df):
+        digest.update(repr(list(df.columns)).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def cache_body_pages(key, bodies):
+    """Devuelve las páginas a medida que se generan y las guarda en la caché al terminar"""
+    pages = []
+    for body in bodies:
+        pages.append(body)
+        yield body
+    page_cache.put(key, pages)
+
+def encode_body_pages(df_result, resumen_df):
+    for page in body_pages(df_result, resumen_df):
+        yield page.width, page.height, zlib.compress(page.content())
+
+def client_band(width, height, razon_social, nro_cotizacion, fecha):
+    """Datos del cliente de una página, medidos desde arriba para no depender del alto"""
+    band = PdfPage(width, height)
+    
+    def text(x, y, value, size):
+        band.text(PDF_PAD + x * PDF_UNIT_X, height - PDF_PAD - (12 - y) * PDF_UNIT_Y, value, size)
+    
+    text(0.5, 10.8, f'Razón social: {razon_social}', 10)
+    text(0.5, 10.6, f'N° de cotiz: {nro_cotizacion}', 10)
+    text(7.5, 10.8, f'Fecha: {fecha}', 10)
+    return band
+
+def body_pages(df_result, resumen_df):
+    """Páginas de la cotización sin los datos del cliente, una por cada rows_per_page filas"""
+    rows_per_page = PDF_ROWS_PER_PAGE
+    total_rows = len(df_result)
+    total_pages = -(-total_rows // rows_per_page)  # Ceiling division
+    values = df_result.values
+    
+    for page_num in range(total_pages):
+        start_row = page_num * rows_per_page
+        end_row = min((page_num + 1) * rows_per_page, total_rows)
+        is_last = page_num == total_pages - 1
         
-        worksheet.write(info_row + 1, 0, 'CUIT:', label_format)
-        worksheet.write(info_row + 1, 1, cuit, value_format)
-        worksheet.write(info_row + 1, 4, 'Fecha:', label_format)
-        worksheet.write(info_row + 1, 5, fecha, value_format)
+        table_top = PDF_TABLE_Y - PDF_HEADER_HEIGHT
+        totals_y = table_top - (end_row - start_row) * PDF_ROW_HEIGHT - 0.8
+        cond_y = totals_y - 1.8
         
-        # Agregar más espacio antes de la tabla
-        worksheet.set_row(6, 10)  # Fila vacía antes de la tabla
+        # Límite inferior de la página, como el recorte de bbox_inches='tight'
+        # (los ejes llegan hasta 0, pero los totales pueden quedar por debajo)
+        y_min = 0
+        if is_last:
+            y_min = min(y_min, cond_y - (len(CONDITIONS) - 1) * 0.18 - DESCENT * 9 / PDF_UNIT_Y)
         
-        # Start table at row 8 (ajustado por el nuevo header)
-        start_row = 8
+        page = PdfPage(10 * PDF_UNIT_X + 2 * PDF_PAD, (12 - y_min) * PDF_UNIT_Y + 2 * PDF_PAD)
         
-        # Write column headers
-        for col, value in enumerate(df_result.columns):
-            worksheet.write(start_row - 1, col, value, header_format)
+        def px(x):
+            return PDF_PAD + x * PDF_UNIT_X
         
-        # Write data with alternating row colors (solo la tabla tiene bordes)
-        for row_idx, row in enumerate(df_result.values):
-            row_format = alt_row_format if row_idx % 2 else cell_format
-            for col_idx, value in enumerate(row):
-                worksheet.write(row_idx + start_row, col_idx, value, row_format)
+        def py(y):
+            return PDF_PAD + (y - y_min) * PDF_UNIT_Y
         
-        # Agregar espacio después de la tabla
-        worksheet.set_row(start_row + len(df_result), 10)
+        def rect(x, y, width, height, **kwargs):
+            page.rect(px(x), py(y), width * PDF_UNIT_X, height * PDF_UNIT_Y, **kwargs)
         
-        # Calcular posición para totales (lado derecho)
-        total_start_col = len(df_result.columns) - 2  # Dos columnas desde la derecha
-        total_row = start_row + len(df_result) + 2
+        def text(x, y, value, size, **kwargs):
+            page.text(px(x), py(y), value, size, **kwargs)
         
-        # Write totals en el lado derecho (sin bordes)
-        for idx, (concepto, importe) in enumerate(resumen_df.values):
-            worksheet.write(total_row + idx, total_start_col, concepto, total_label_format)
-            worksheet.write(total_row + idx, total_start_col + 1, importe, total_value_format)
+        # Header background, company name and subtitle
+        rect(0, 11.2, 10, 0.8, fill='#14324B')
+        text(5, 11.75, 'Acquatrade Sudamericana S.A', 18, bold=True, color='#FFFFFF', align='center', valign='center')
+        text(5, 11.4, 'Cotización', 14, color='#FFFFFF', align='center', valign='center')
         
-        # Agregar espacio antes de las condiciones
-        conditions_row = total_row + len(resumen_df) + 2
-        conditions = [
-            "Condiciones comerciales:",
-            "• Validez de la presente cotización: 3 días corridos.",
-            "• Precios expresados en dólares.",
-            "• Forma de pago: a convenir.",
-            "• Entrega: sujeta a disponibilidad de stock."
-        ]
+        # Los datos del cliente se dibujan aparte (client_band)
         
-        condition_format = workbook.add_format({
-            'align': 'left',
-            'valign': 'vcenter'
-        })
+        # Page number
+        if total_pages > 1:
+            text(6.5, 10.75, f'Página {page_num + 1}/{total_pages}', 10, color='#FFFFFF', align='right')
         
-        condition_title_format = workbook.add_format({
-            'bold': True,
-            'align': 'left',
-            'valign': 'vcenter'
-        })
+        # Table headers
+        for header, start, width in zip(PDF_HEADERS, PDF_COL_STARTS, PDF_COL_WIDTHS):
+            rect(start, PDF_TABLE_Y, width, PDF_HEADER_HEIGHT, fill='#14324B', stroke='#000000', line_width=1)
+            text(start + width/2, PDF_TABLE_Y + PDF_HEADER_HEIGHT/2, header, 8, bold=True,
+                 color='#FFFFFF', align='center', valign='center')
         
-        for idx, condition in enumerate(conditions):
-            format_to_use = condition_title_format if idx == 0 else condition_format
-            worksheet.write(conditions_row + idx, 0, condition, format_to_use)
+        # Table data
+        for idx, row_data in enumerate(values[start_row:end_row]):
+            y_pos = table_top - (idx * PDF_ROW_HEIGHT)
+            for col_idx, (value, start, width) in enumerate(zip(row_data, PDF_COL_STARTS, PDF_COL_WIDTHS)):
+                rect(start, y_pos, width, PDF_ROW_HEIGHT, fill='#FFFFFF', stroke='#D3D3D3', line_width=0.3)
+                text_value = pdf_cell_text(value, width)
+                if col_idx >= 2:  # Numeric columns
+                    text(start + width - 0.05, y_pos + PDF_ROW_HEIGHT/2, text_value, 6.5, align='right', valign='center')
+                else:  # Description columns
+                    text(start + 0.1, y_pos + PDF_ROW_HEIGHT/2, text_value, 6.5, valign='center')
         
-        # Footer (centrado arriba de las condiciones)
-        # El footer debe ir ARRIBA de las condiciones, ocupando todas las columnas de la tabla
-        # Para asegurarnos de que está arriba de todo, lo ponemos antes del bloque de condiciones, con 2 filas de espacio antes
-        for idx, col in enumerate(df_result.columns):
-            # Calcular el ancho máximo necesario
-            header_width = len(str(col))
-            max_content_width = 0
-            
-            # Revisar el contenido de cada celda en la columna
-            for value in df_result[col]:
-                content_width = len(str(value))
-                if content_width > max_content_width:
-                    max_content_width = content_width
-            
-            # Usar el mayor entre header y contenido, con un mínimo de 10 y máximo de 50
-            optimal_width = max(header_width, max_content_width) + 3
-            final_width = min(max(optimal_width, 10), 50)
+        # Only show totals and conditions on the last page
+        if is_last:
+            text(7.0, totals_y + 0.5, 'TOTALES', 12, bold=True)
+            for i, (concepto, importe) in enumerate(resumen_df.values):
+                y = totals_y - (i * 0.25)
+                text(6.5, y, f'{concepto}:', 9, bold=True)
+                text(9.5, y, f'${importe:,.2f} USD', 9, bold=True, align='right')
             
-            worksheet.set_column(idx, idx, final_width)
+            for i, condition in enumerate(CONDITIONS):
+                text(0.5, cond_y - (i * 0.18), condition, 9, bold=(i == 0))
         
-        # Ajustar altura de filas de la tabla para texto largo
-        for row_idx in range(len(df_result)):
-            worksheet.set_row(start_row + row_idx, 20)  # Altura mínima para texto
-    
-    return excel_path, excel_filename
+        yield page
 
-def generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
-    # Create PDF file in our tmp directory
-    pdf_filename = f"temp_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], pdf_filename)
+def generate_pdf_matplotlib(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output):
+    # matplotlib sólo se importa si se usa este renderer (es lo más lento de importar)
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from matplotlib.backends.backend_pdf import PdfPages
     
     # Set up matplotlib to not display plots
     plt.ioff()
     
     # Calculate how many rows we can fit per page
-    rows_per_page = 30  # Aumentado para más items por página0
+    rows_per_page = PDF_ROWS_PER_PAGE
     total_rows = len(df_result)
     total_pages = -(-total_rows // rows_per_page)  # Ceiling division
     
     # Create PDF with matplotlib - multiple pages approach
-    with PdfPages(pdf_path) as pdf:
+    with PdfPages(output) as pdf:
         # Headers and column setup (constants)
-        headers = ['Descripción Artículo', 'Desc. Adicional', 'Cantidad', 'Precio', '% IVA', 'Precio Neto']
-        col_widths = [3.0, 2.0, 1.0, 1.0, 0.8, 1.2]
-        col_starts = [0.5, 3.5, 5.5, 6.5, 7.5, 8.3]
-        header_height = 0.3
-        row_height = 0.25  # Reduced for more compact rows
+        headers = PDF_HEADERS
+        col_widths = PDF_COL_WIDTHS
+        col_starts = PDF_COL_STARTS
+        header_height = PDF_HEADER_HEIGHT
+        row_height = PDF_ROW_HEIGHT
         
         for page in range(total_pages):
             fig = plt.figure(figsize=(8.3, 11.7))  # A4 portrait
@@ -417,7 +1141,7 @@ def generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
                        horizontalalignment='right', fontsize=10, color='white')
             
             # Table setup
-            table_y = 9.2
+            table_y = PDF_TABLE_Y
             
             # Draw table headers
             for i, (header, start, width) in enumerate(zip(headers, col_starts, col_widths)):
@@ -442,9 +1166,7 @@ def generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
                     ax.add_patch(border)
                     
                     # Cell text
-                    text_value = str(value) if pd.notna(value) else ""
-                    if len(text_value) > int(width * 12):  # Aumentado para más caracteres
-                        text_value = text_value[:int(width * 12)-3] + "..."
+                    text_value = pdf_cell_text(value, width)
                     
                     # Align numbers right, text left for descriptions
                     if col_idx >= 2:  # Numeric columns
@@ -468,91 +1190,375 @@ def generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha):
                 
                 # Conditions
                 cond_y = totals_y - 1.8
-                conditions = [
-                    "Condiciones comerciales:",
-                    "• Validez de la presente cotización: 3 días corridos.",
-                    "• Precios expresados en dólares.",
-                    "• Forma de pago: a convenir.",
-                    "• Entrega: sujeta a disponibilidad de stock."
-                ]
                 
-                for i, condition in enumerate(conditions):
+                for i, condition in enumerate(CONDITIONS):
                     weight = 'bold' if i == 0 else 'normal'
                     ax.text(0.5, cond_y - (i * 0.18), condition, fontsize=9, weight=weight)
             
             # Save page
             pdf.savefig(fig, bbox_inches='tight', dpi=300, facecolor='white', edgecolor='none')
             plt.close(fig)
-    
-    return pdf_path, pdf_filename
+
+@app.before_request
+def start_request_trace():
+    # Sólo se trazan los requests que procesan documentos
+    if request.method == 'POST':
+        metrics.start_trace(request.endpoint)
+
+@app.after_request
+def finish_request_trace(response):
+    metrics.finish_trace(response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Valores del proceso que atiende el request (cada worker tiene los suyos)
+    cache_stats = result_cache.stats()
+    body = metrics.render([
+        ('quote_result_cache_hits_total', 'Aciertos de la caché de extracciones.', cache_stats['hits']),
+        ('quote_result_cache_misses_total', 'Fallos de la caché de extracciones.', cache_stats['misses']),
+    ])
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 @app.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
 
+def validate_upload():
+    """Valida el archivo subido; devuelve (file, None) o (None, respuesta de error)"""
+    if 'file' not in request.files:
+        return None, ('No file uploaded', 400)
+    
+    file = request.files['file']
+    if file.filename == '':
+        return None, ('No file selected', 400)
+    
+    if not file.filename.lower().endswith('.pdf'):
+        return None, ('Only PDF files are allowed', 400)
+    
+    return file, None
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    file, error = validate_upload()
+    if error:
+        return error
+    
     try:
-        # Limpiar archivos temporales antiguos
-        cleanup_old_files()
-        
-        if 'file' not in request.files:
-            return 'No file uploaded', 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return 'No file selected', 400
-        
-        if not file.filename.lower().endswith('.pdf'):
-            return 'Only PDF files are allowed', 400
-        
         # Get form data
         razon_social = request.form.get('razon_social', '')
         cuit = request.form.get('cuit', '')
         nro_cotizacion = request.form.get('nro_cotizacion', '')
         fecha = request.form.get('fecha', '')
         
-        # Create a unique filename
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Process PDF
-        df_result, resumen_df = process_pdf(filepath)
+        # Process PDF directly from the uploaded stream
+        df_result, resumen_df = extract_quote(file.stream)
         
-        # Generate PDF only
-        pdf_path, pdf_filename = generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha)
+        base_filename = os.path.splitext(secure_filename(file.filename))[0]
         
-        # Clean up original PDF file
-        os.unlink(filepath)
+        # Modo streaming: cada página sale apenas se dibuja (transferencia chunked)
+        if (request.values.get('stream') == '1'
+                and pdf_renderer(df_result, resumen_df, razon_social, nro_cotizacion, fecha) == 'native'):
+            response = Response(
+                iter_pdf_native(df_result, resumen_df, razon_social, nro_cotizacion, fecha),
+                mimetype='application/pdf'
+            )
+            response.headers.set('Content-Disposition', 'attachment', filename=base_filename + '.pdf')
+            return response
         
-        # Rename file to match original PDF name
-        base_filename = os.path.splitext(filename)[0]
-        final_pdf_filename = base_filename + '.pdf'
-        final_pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], final_pdf_filename)
+        # PDF y Excel en un ZIP, a partir de una única extracción
+        if request.values.get('output') == 'both':
+            pdf_data, excel_data = render_both(df_result, resumen_df, razon_social, nro_cotizacion, fecha, cuit)
+            archive = ZipStream()
+            with open_output(pdf_data) as pdf_file, open_output(excel_data) as excel_file:
+                chunks = [
+                    archive.add_fileobj(base_filename + '.pdf', pdf_file),
+                    archive.add_fileobj(base_filename + '.xlsx', excel_file),
+                    archive.close(),
+                ]
+            response = Response(chunks, mimetype='application/zip')
+            response.headers.set('Content-Disposition', 'attachment', filename=base_filename + '.zip')
+            return response
         
-        # Move the generated file to final name
-        shutil.move(pdf_path, final_pdf_path)
+        # Generate PDF only, in memory unless it exceeds SPOOL_MAX_SIZE
+        output = render_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha)
         
-        # Send PDF file
-        return send_file(
-            final_pdf_path,
-            as_attachment=True,
-            download_name=final_pdf_filename,
-            mimetype='application/pdf'
-        )
+        # Send PDF file with the original PDF name
+        return send_buffer(output, base_filename + '.pdf', 'application/pdf')
     
+    except BudgetExceeded as e:
+        return str(e), 422
     except Exception as e:
-        # Clean up files in case of error
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.unlink(filepath)
-        if 'final_excel_path' in locals() and os.path.exists(final_excel_path):
-            os.unlink(final_excel_path)
-        if 'final_pdf_path' in locals() and os.path.exists(final_pdf_path):
-            os.unlink(final_pdf_path)
-        if 'zip_path' in locals() and os.path.exists(zip_path):
-            os.unlink(zip_path)
         return str(e), 500
 
+# Formatos de /api/extract: parámetro format -> tipo MIME
+EXTRACT_FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+EXTRACT_CHUNK_ROWS = 1000  # Filas por fragmento en las respuestas en streaming
+
+def negotiate_format():
+    """Formato pedido por ?format= o, si no está, por el header Accept"""
+    requested = request.args.get('format')
+    if requested:
+        return requested if requested in EXTRACT_FORMATS else None
+    if not request.accept_mimetypes:
+        return 'json'
+    # Un Accept que no admite ninguno de los formatos es un 406, igual que un format= desconocido
+    mimetype = request.accept_mimetypes.best_match(list(EXTRACT_FORMATS.values()))
+    return next((name for name, value in EXTRACT_FORMATS.items() if value == mimetype), None)
+
+def iter_json(df_result, resumen_df):
+    """JSON {"items": [...], "totals": [...]} de a EXTRACT_CHUNK_ROWS filas"""
+    yield '{"items":['
+    for start in range(0, len(df_result), EXTRACT_CHUNK_ROWS):
+        records = df_result.iloc[start:start + EXTRACT_CHUNK_ROWS].to_json(orient='records', force_ascii=False)
+        yield ('' if start == 0 else ',') + records[1:-1]
+    yield '],"totals":' + resumen_df.to_json(orient='records', force_ascii=False) + '}'
+
+def iter_csv(df):
+    yield df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(df), EXTRACT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXTRACT_CHUNK_ROWS].to_csv(index=False, header=False)
+
+@app.route('/api/extract', methods=['POST'])
+def api_extract():
+    """Sólo la extracción: ítems y totales en JSON, CSV o Parquet, sin generar el PDF"""
+    file, error = validate_upload()
+    if error:
+        return error
+    
+    output_format = negotiate_format()
+    if output_format is None:
+        return f"Unsupported format, use one of: {', '.join(EXTRACT_FORMATS)}", 406
+    
+    # CSV y Parquet llevan una sola tabla: ítems (por defecto) o totales
+    table = request.args.get('table', 'items')
+    if table not in ('items', 'totals'):
+        return 'table must be items or totals', 400
+    
+    try:
+        df_result, resumen_df = extract_quote(file.stream)
+    except BudgetExceeded as e:
+        return str(e), 422
+    except Exception as e:
+        return str(e), 500
+    
+    base_filename = os.path.splitext(secure_filename(file.filename))[0]
+    mimetype = EXTRACT_FORMATS[output_format]
+    if output_format == 'json':
+        return Response(iter_json(df_result, resumen_df), mimetype=mimetype)
+    
+    df = df_result if table == 'items' else resumen_df
+    if output_format == 'csv':
+        response = Response(iter_csv(df), mimetype=mimetype)
+        response.headers.set('Content-Disposition', 'attachment', filename=f'{base_filename}_{table}.csv')
+        return response
+    
+    output = spooled_buffer()
+    df.to_parquet(output, index=False)
+    return send_buffer(output, f'{base_filename}_{table}.parquet', mimetype)
+
+def run_quote_job(report, filepath, job_folder, razon_social, nro_cotizacion, fecha):
+    """Procesa una cotización dentro del pool de trabajos"""
+    report('extracting')
+    df_result, resumen_df = extract_quote(filepath)
+    
+    report('rendering')
+    pdf_path, _ = generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha, output_folder=job_folder)
+    os.unlink(filepath)
+    
+    base_filename = os.path.splitext(os.path.basename(filepath))[0]
+    return pdf_path, base_filename + '.pdf', 'application/pdf'
+
+def job_status(job):
+    status = {key: job[key] for key in ('id', 'status', 'stage', 'error', 'created_at', 'updated_at')}
+    status['status_url'] = url_for('get_job', job_id=job['id'])
+    if job['status'] == 'done':
+        status['result_url'] = url_for('get_job_result', job_id=job['id'])
+    return status
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    file, error = validate_upload()
+    if error:
+        return error
+    
+    try:
+        job_id, job_folder = job_queue.create()
+    except QueueFullError as e:
+        return str(e), 503, {'Retry-After': '30'}
+    
+    filepath = os.path.join(job_folder, secure_filename(file.filename))
+    file.save(filepath)
+    
+    try:
+        job_queue.submit(
+            job_id, run_quote_job, filepath, job_folder,
+            request.form.get('razon_social', ''),
+            request.form.get('nro_cotizacion', ''),
+            request.form.get('fecha', '')
+        )
+    except BrokenProcessPool:
+        # El pool se vuelve a crear en el próximo trabajo
+        return 'El procesamiento no está disponible, intente más tarde', 503, {'Retry-After': '5'}
+    
+    status_url = url_for('get_job', job_id=job_id)
+    return jsonify(job_status(job_queue.get(job_id))), 202, {'Location': status_url}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return 'Job not found', 404
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return 'Job not found', 404
+    if job['status'] == 'error':
+        return job['error'], 500
+    if job['status'] != 'done':
+        return jsonify(job_status(job)), 409
+    
+    return send_file(
+        job['result_path'],
+        as_attachment=True,
+        download_name=job['download_name'],
+        mimetype=job['mimetype']
+    )
+
+def collect_batch_files(batch_folder):
+    """Guarda en disco, de a uno, los PDFs subidos (sueltos o dentro de ZIPs) y devuelve [(nombre, ruta)].
+    
+    Lanza RequestEntityTooLarge si el total supera BATCH_MAX_BYTES.
+    """
+    pdf_files = []
+    remaining = app.config['BATCH_MAX_BYTES']
+    
+    def save(filename, src, size):
+        nonlocal remaining
+        remaining -= size
+        if remaining < 0:
+            raise RequestEntityTooLarge(f"El lote supera {app.config['BATCH_MAX_BYTES'] // 2**20} MB")
+        # Una carpeta por archivo para que las salidas no choquen entre procesos
+        item_folder = os.path.join(batch_folder, str(len(pdf_files)))
+        os.makedirs(item_folder)
+        filepath = os.path.join(item_folder, filename)
+        with open(filepath, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        pdf_files.append((filename, filepath))
+    
+    for file in request.files.getlist('file'):
+        filename = secure_filename(file.filename)
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                for member in archive.infolist():
+                    member_name = secure_filename(os.path.basename(member.filename))
+                    if member.is_dir() or not member_name.lower().endswith('.pdf'):
+                        continue
+                    # zipfile no entrega más de file_size bytes por miembro (y verifica el CRC)
+                    with archive.open(member) as src:
+                        save(member_name, src, member.file_size)
+        elif filename.lower().endswith('.pdf'):
+            size = file.stream.seek(0, os.SEEK_END)
+            file.stream.seek(0)
+            save(filename, file.stream, size)
+    return pdf_files
+
+def render_batch_item(filepath, razon_social, nro_cotizacion, fecha):
+    """Procesa un PDF del lote dentro del pool y devuelve la ruta del PDF generado"""
+    df_result, resumen_df = extract_quote(filepath)
+    pdf_path, _ = generate_pdf(df_result, resumen_df, razon_social, nro_cotizacion, fecha,
+                               output_folder=os.path.dirname(filepath))
+    return pdf_path
+
+def output_names(filenames):
+    """Nombres de salida únicos dentro del ZIP, a partir de los nombres subidos"""
+    used = set()
+    names = []
+    for filename in filenames:
+        base_filename = os.path.splitext(filename)[0]
+        name = base_filename + '.pdf'
+        counter = 1
+        while name in used:
+            counter += 1
+            name = f'{base_filename}_{counter}.pdf'
+        used.add(name)
+        names.append(name)
+    return names
+
+def run_batch_job(report, pdf_files, job_folder, razon_social, nro_cotizacion, fecha):
+    """Procesa un lote dentro del pool de trabajos, con los PDFs repartidos en el pool de lotes"""
+    names = output_names(filename for filename, _ in pdf_files)
+    executor, futures = batch_pool.submit_all(
+        [(render_batch_item, (filepath, razon_social, nro_cotizacion, fecha)) for _, filepath in pdf_files]
+    )
+    items = {future: (filename, filepath, name) for future, (filename, filepath), name in zip(futures, pdf_files, names)}
+    
+    zip_path = os.path.join(job_folder, 'cotizaciones.zip')
+    manifest = []
+    try:
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            # Los PDFs se agregan a medida que terminan, con el manifiesto al final
+            for done, future in enumerate(as_completed(futures), 1):
+                filename, filepath, name = items[future]
+                try:
+                    pdf_path = future.result()
+                except Exception as e:
+                    manifest.append({'file': filename, 'status': 'error', 'error': str(e)})
+                else:
+                    archive.write(pdf_path, name)
+                    manifest.append({'file': filename, 'status': 'ok', 'output': name})
+                shutil.rmtree(os.path.dirname(filepath), ignore_errors=True)
+                report(f'{done}/{len(futures)}')
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    finally:
+        # Al salir, multiprocessing esperaría a los procesos del pool, que siguen ociosos
+        batch_pool.discard(executor)
+    return zip_path, 'cotizaciones.zip', 'application/zip'
+
+@app.route('/batch', methods=['POST'])
+def upload_batch():
+    """Encola un lote; el ZIP con los resultados se descarga desde /jobs/<id>/result"""
+    try:
+        job_id, job_folder = job_queue.create()
+    except QueueFullError as e:
+        return str(e), 503, {'Retry-After': '30'}
+    
+    try:
+        pdf_files = collect_batch_files(job_folder)
+    except zipfile.BadZipFile:
+        job_queue.remove(job_id)
+        return 'Invalid ZIP file', 400
+    except RequestEntityTooLarge as e:
+        job_queue.remove(job_id)
+        return e.description, 413
+    
+    if not pdf_files:
+        job_queue.remove(job_id)
+        return 'No PDF files uploaded', 400
+    
+    try:
+        job_queue.submit(
+            job_id, run_batch_job, pdf_files, job_folder,
+            request.form.get('razon_social', ''),
+            request.form.get('nro_cotizacion', ''),
+            request.form.get('fecha', '')
+        )
+    except BrokenProcessPool:
+        return 'El procesamiento no está disponible, intente más tarde', 503, {'Retry-After': '5'}
+    
+    status_url = url_for('get_job', job_id=job_id)
+    return jsonify(job_status(job_queue.get(job_id))), 202, {'Location': status_url}
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,61 @@
+"""Mide el tiempo de importación de app.py y falla si supera el presupuesto.
+
+Uso: python benchmarks/import_time.py [--budget SEGUNDOS] [--runs N]
+
+Cada medición corre en un intérprete nuevo y se toma la mejor de N, para
+que el resultado no dependa de la caché de bytecode ni del ruido del sistema.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Presupuesto por defecto, medido con las dependencias de requirements.txt
+DEFAULT_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', 1.2))
+
+# Módulos que no deben cargarse al importar la app
+LAZY_MODULES = ['matplotlib']
+
+MEASURE = '''
+import sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+loaded = [name for name in {lazy!r} if name in sys.modules]
+print(elapsed, ','.join(loaded))
+'''
+
+
+def measure_once():
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(lazy=LAZY_MODULES)],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout.split()
+    return float(output[0]), output[1].split(',') if len(output) > 1 else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [measure_once() for _ in range(args.runs)]
+    best = min(elapsed for elapsed, _ in results)
+    eager = sorted({name for _, loaded in results for name in loaded})
+
+    print(f'import app: {best:.3f}s (presupuesto {args.budget:.3f}s, mejor de {args.runs})')
+    failed = False
+    if best > args.budget:
+        print(f'ERROR: la importación supera el presupuesto por {best - args.budget:.3f}s')
+        failed = True
+    if eager:
+        print(f'ERROR: módulos que deberían importarse bajo demanda: {", ".join(eager)}')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Benchmarks de process_pdf, generate_pdf y generate_excel sobre cotizaciones sintéticas.
+
+Uso:
+    python benchmarks/run.py                      # compara contra baseline.json
+    python benchmarks/run.py --sizes 1 10         # sólo algunos tamaños
+    python benchmarks/run.py --update-baseline    # guarda los resultados como baseline
+
+Para cada tamaño (en páginas de tabla) se mide el tiempo de cada etapa (mejor
+de --repeat corridas) y, en una corrida aparte con tracemalloc, el pico de
+memoria asignada. Si alguna etapa supera al baseline por más de la tolerancia
+(y por más del mínimo absoluto, para no fallar por ruido en las etapas cortas)
+el script termina con código 1.
+
+Las cachés que persisten entre corridas (páginas del PDF y layouts aprendidos)
+se desactivan antes de importar la app, para medir siempre el trabajo completo,
+y la extracción corre en serie: tracemalloc no ve los procesos del pool y el
+tiempo en paralelo depende de los núcleos de la máquina.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Sin esto la segunda corrida (y cada --repeat) mide aciertos de caché
+os.environ.setdefault('PDF_PAGE_CACHE_ENABLED', '0')
+os.environ.setdefault('LAYOUT_LEARN', '0')
+os.environ.setdefault('LAYOUTS_FILE', os.devnull)  # ningún layout registrado
+os.environ.setdefault('PARALLEL_EXTRACTION', '0')
+
+import app  # noqa: E402
+from synthetic import make_quote_pdf  # noqa: E402
+
+DEFAULT_SIZES = [1, 10, 100, 500]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+CLIENT = ('Cliente Benchmark S.A.', '0001-00000001', '2026-01-01')
+
+
+def run_stages(pdf_path, output_folder):
+    """Ejecuta las tres etapas y devuelve sus funciones en orden"""
+    state = {}
+
+    def extract():
+        state['df_result'], state['resumen_df'] = app.process_pdf(pdf_path)
+
+    def render_pdf():
+        pdf_path_out, _ = app.generate_pdf(state['df_result'], state['resumen_df'], *CLIENT,
+                                           output_folder=output_folder)
+        os.unlink(pdf_path_out)
+
+    def render_excel():
+        app.generate_excel(state['df_result'], state['resumen_df'], *CLIENT, output=io.BytesIO())
+
+    return [('process_pdf', extract), ('generate_pdf', render_pdf), ('generate_excel', render_excel)]
+
+
+def measure(pdf_path, output_folder, repeat, with_memory):
+    results = {}
+    for _ in range(repeat):
+        for name, func in run_stages(pdf_path, output_folder):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = results.setdefault(name, {}).get('seconds')
+            results[name]['seconds'] = elapsed if best is None else min(best, elapsed)
+
+    if with_memory:
+        for name, func in run_stages(pdf_path, output_folder):
+            tracemalloc.start()
+            func()
+            results[name]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+    return results
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance, min_seconds=0.0, min_mb=0.0):
+    """Devuelve la lista de regresiones respecto del baseline.
+
+    Una diferencia cuenta si supera la tolerancia relativa y además el mínimo
+    absoluto (min_seconds, min_mb).
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, values in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if not reference:
+                continue
+            checks = [('seconds', time_tolerance, min_seconds), ('peak_mb', memory_tolerance, min_mb)]
+            for metric, tolerance, minimum in checks:
+                if metric not in values or metric not in reference:
+                    continue
+                limit = max(reference[metric] * (1 + tolerance), reference[metric] + minimum)
+                if values[metric] > limit:
+                    regressions.append(
+                        f'{size} páginas / {stage}: {metric} {values[metric]:.3f} > {limit:.3f} '
+                        f'(baseline {reference[metric]:.3f} + {tolerance:.0%}, mínimo {minimum:g})'
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--time-tolerance', type=float, default=0.3)
+    parser.add_argument('--memory-tolerance', type=float, default=0.2)
+    parser.add_argument('--min-time-delta', type=float, default=0.02,
+                        help='segundos por encima del baseline que se ignoran')
+    parser.add_argument('--min-memory-delta', type=float, default=1.0,
+                        help='MB por encima del baseline que se ignoran')
+    parser.add_argument('--no-memory', action='store_true', help='omitir la corrida con tracemalloc')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help='guardar los resultados en este archivo JSON')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            pdf_path = os.path.join(workdir, f'quote_{size}.pdf')
+            with open(pdf_path, 'wb') as f:
+                make_quote_pdf(f, size)
+            results[str(size)] = measure(pdf_path, workdir, args.repeat, not args.no_memory)
+            for stage, values in results[str(size)].items():
+                memory = f'  {values["peak_mb"]:8.1f} MB' if 'peak_mb' in values else ''
+                print(f'{size:>4} páginas  {stage:<15} {values["seconds"]:8.3f} s{memory}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline actualizado: {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No hay baseline en {args.baseline}; usar --update-baseline para crearlo')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance,
+                          args.min_time_delta, args.min_memory_delta)
+    if regressions:
+        print('\nREGRESIONES DE RENDIMIENTO:')
+        for regression in regressions:
+            print(f'  - {regression}')
+        return 1
+    print('\nSin regresiones respecto del baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
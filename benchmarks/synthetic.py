@@ -0,0 +1,105 @@
+"""Generador de cotizaciones sintéticas de proveedor para los benchmarks.
+
+Las páginas imitan el formato que espera process_pdf: una tabla con las
+columnas del proveedor cuyas celdas traen varias líneas separadas por
+saltos de línea, y el bloque de totales en texto al final del documento.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_writer import PdfPage, PdfWriter  # noqa: E402
+
+HEADERS = ['Descripción Artículo', 'Desc. Adicional', 'Cantidad', 'Precio Unit', '% Desc.', '% IVA', 'Importe']
+COL_WIDTHS = [150, 110, 50, 60, 45, 40, 60]
+
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 20
+HEADER_HEIGHT = 18
+LINE_HEIGHT = 9
+FONT_SIZE = 7
+
+
+def make_items(rows, rng):
+    items = []
+    for idx in range(rows):
+        cantidad = rng.randint(1, 50)
+        precio = round(rng.uniform(1, 2500), 2)
+        descuento = rng.choice([0, 0, 5, 10])
+        iva = rng.choice([21, 10.5])
+        importe = round(cantidad * precio * (1 - descuento / 100), 2)
+        items.append([
+            f'ARTICULO {idx:05d} {rng.choice(["VALVULA", "CAÑO", "BOMBA", "FILTRO", "CODO"])}',
+            f'COD-{rng.randint(1000, 9999)}',
+            str(cantidad), f'{precio:.2f}', str(descuento), str(iva), f'{importe:.2f}',
+        ])
+    return items
+
+
+def draw_table_page(items):
+    page = PdfPage(PAGE_WIDTH, PAGE_HEIGHT)
+    x_positions = [MARGIN]
+    for width in COL_WIDTHS:
+        x_positions.append(x_positions[-1] + width)
+
+    top = PAGE_HEIGHT - 3 * MARGIN
+    page.text(MARGIN, PAGE_HEIGHT - 2 * MARGIN, 'COTIZACION PROVEEDOR', 12, bold=True)
+
+    # Fila de encabezados
+    for header, x, width in zip(HEADERS, x_positions, COL_WIDTHS):
+        page.rect(x, top - HEADER_HEIGHT, width, HEADER_HEIGHT, stroke='#000000', line_width=0.5)
+        page.text(x + 2, top - HEADER_HEIGHT + 6, header, FONT_SIZE, bold=True)
+
+    # Una sola fila de datos con todas las líneas de cada columna
+    body_height = len(items) * LINE_HEIGHT + 6
+    body_top = top - HEADER_HEIGHT
+    for col, (x, width) in enumerate(zip(x_positions, COL_WIDTHS)):
+        page.rect(x, body_top - body_height, width, body_height, stroke='#000000', line_width=0.5)
+        for line, item in enumerate(items):
+            page.text(x + 2, body_top - (line + 1) * LINE_HEIGHT, item[col], FONT_SIZE)
+    return page
+
+
+def draw_totals_page(totals):
+    page = PdfPage(PAGE_WIDTH, PAGE_HEIGHT)
+    page.text(MARGIN, PAGE_HEIGHT - 2 * MARGIN, 'Condiciones generales de venta', 12, bold=True)
+    y = PAGE_HEIGHT - 4 * MARGIN
+    for label, value in totals:
+        page.text(MARGIN, y, f'{label}: {value:,.2f}', 10)
+        y -= 14
+    return page
+
+
+def make_quote_pdf(stream, pages, rows_per_page=60, seed=0):
+    """Escribe una cotización de `pages` páginas de tabla más una página de totales"""
+    rng = random.Random(seed)
+    writer = PdfWriter(stream)
+    subtotal = 0.0
+    iva = 0.0
+    for _ in range(pages):
+        items = make_items(rows_per_page, rng)
+        for item in items:
+            importe = float(item[6])
+            subtotal += importe
+            iva += importe * float(item[5]) / 100
+        writer.add_page(draw_table_page(items))
+
+    bonificacion = round(subtotal * 0.05, 2)
+    writer.add_page(draw_totals_page([
+        ('Subtotal Cotización', subtotal),
+        ('Bonificación', bonificacion),
+        ('Subtotal Neto', subtotal - bonificacion),
+        ('IVA', iva * 0.95),
+        ('Total Cotización', subtotal - bonificacion + iva * 0.95),
+    ]))
+    writer.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('Uso: python benchmarks/synthetic.py SALIDA.pdf PAGINAS')
+    with open(sys.argv[1], 'wb') as f:
+        make_quote_pdf(f, int(sys.argv[2]))
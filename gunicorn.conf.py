@@ -1,3 +1,11 @@
-workers = 4
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# La app reparte los núcleos entre los workers para dimensionar sus pools de procesos
+os.environ['WEB_CONCURRENCY'] = str(workers)
 bind = "0.0.0.0:10000"
 timeout = 120
+
+# Importar la app (pandas, pdfplumber, numpy) una sola vez en el master;
+# los workers la heredan por fork y comparten esas páginas de memoria
+preload_app = True
@@ -0,0 +1,160 @@
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from functools import partial
+
+from pools import ProcessPool
+
+# Estados posibles de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+
+class QueueFullError(Exception):
+    """Se alcanzó el límite de trabajos pendientes"""
+
+
+@contextmanager
+def _connect(db_path):
+    """Abre una conexión, confirma la transacción y la cierra al salir"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _update(db_path, job_id, **fields):
+    fields['updated_at'] = time.time()
+    columns = ', '.join(f'{name} = ?' for name in fields)
+    with _connect(db_path) as conn:
+        conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+
+def _fail(db_path, job_id, error):
+    """Marca como fallido un trabajo que todavía no terminó"""
+    with _connect(db_path) as conn:
+        conn.execute('UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)',
+                     (ERROR, error, time.time(), job_id, QUEUED, RUNNING))
+
+
+def _run_job(db_path, job_id, func, args):
+    """Ejecuta un trabajo dentro del proceso del pool y registra su estado"""
+    def report(stage):
+        _update(db_path, job_id, stage=stage)
+
+    _update(db_path, job_id, status=RUNNING)
+    try:
+        result_path, download_name, mimetype = func(report, *args)
+    except Exception as e:
+        _update(db_path, job_id, status=ERROR, error=str(e))
+    else:
+        _update(db_path, job_id, status=DONE, stage=None, result_path=result_path,
+                download_name=download_name, mimetype=mimetype)
+
+
+class JobQueue:
+    """Cola local de trabajos respaldada por SQLite y un pool de procesos.
+
+    El estado vive en SQLite para que cualquier worker de gunicorn pueda
+    responder las consultas, sin depender de un broker externo. Los
+    trabajos pendientes que no se actualizan en stale_after segundos (el
+    proceso que los corría murió) se marcan como fallidos.
+    """
+
+    def __init__(self, folder, max_workers=2, max_pending=16, ttl=3600, stale_after=900):
+        self.folder = folder
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.db_path = os.path.join(folder, 'jobs.sqlite3')
+        self.pool = ProcessPool(max_workers)
+
+        os.makedirs(folder, exist_ok=True)
+        with _connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    error TEXT,
+                    result_path TEXT,
+                    download_name TEXT,
+                    mimetype TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+    def job_folder(self, job_id):
+        return os.path.join(self.folder, job_id)
+
+    def create(self):
+        """Reserva un lugar en la cola y devuelve el id y la carpeta del trabajo"""
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with _connect(self.db_path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            pending = conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFullError('Demasiados trabajos pendientes, intente más tarde')
+            conn.execute(
+                'INSERT INTO jobs (id, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                (job_id, QUEUED, now, now)
+            )
+        os.makedirs(self.job_folder(job_id), exist_ok=True)
+        return job_id, self.job_folder(job_id)
+
+    def submit(self, job_id, func, *args):
+        """Encola func(report, *args); debe devolver (ruta, nombre de descarga, mimetype)"""
+        try:
+            future = self.pool.submit(_run_job, self.db_path, job_id, func, args)
+        except Exception as e:
+            _update(self.db_path, job_id, status=ERROR, error=str(e))
+            raise
+        future.add_done_callback(partial(self._finished, job_id))
+
+    def _finished(self, job_id, future):
+        # _run_job registra sus errores; acá sólo llegan los del pool (un hijo que murió)
+        if future.cancelled():
+            _fail(self.db_path, job_id, 'El trabajo se canceló')
+        elif future.exception() is not None:
+            _fail(self.db_path, job_id, str(future.exception()) or 'El proceso del trabajo terminó inesperadamente')
+
+    def remove(self, job_id):
+        """Elimina un trabajo que no llegó a encolarse (por ejemplo, por datos inválidos)"""
+        with _connect(self.db_path) as conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        shutil.rmtree(self.job_folder(job_id), ignore_errors=True)
+
+    def get(self, job_id):
+        with _connect(self.db_path) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def purge_expired(self):
+        """Marca como fallidos los trabajos colgados y elimina los terminados más viejos que el TTL"""
+        now = time.time()
+        limit = now - self.ttl
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?) AND updated_at < ?',
+                (ERROR, 'El trabajo no terminó a tiempo', now, QUEUED, RUNNING, now - self.stale_after)
+            )
+            expired = [row['id'] for row in conn.execute(
+                'SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?', (DONE, ERROR, limit)
+            )]
+            conn.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in expired])
+        for job_id in expired:
+            shutil.rmtree(self.job_folder(job_id), ignore_errors=True)
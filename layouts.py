@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# Nombre interno de cada columna -> encabezado en el PDF del proveedor
+DEFAULT_COLUMNS = {
+    'Descripción Artículo': 'Descripción Artículo',
+    'Desc. Adicional': 'Desc. Adicional',
+    'Cantidad': 'Cantidad',
+    'Precio Unit': 'Precio Unit',
+    '% Desc.': '% Desc.',
+    '% IVA': '% IVA',
+    'Importe': 'Importe',
+}
+
+# Palabras que identifican la fila de encabezados de la tabla
+HEADER_KEYWORDS = ('Cantidad', 'Importe')
+
+# Tolerancia vertical (en puntos) para agrupar las palabras del encabezado
+HEADER_LINE_TOLERANCE = 2
+
+
+def header_words(page):
+    """Palabras de la línea de encabezados de la tabla, o [] si la página no la tiene"""
+    words = page.extract_words()
+    anchor = next((word for word in words if word['text'] in HEADER_KEYWORDS), None)
+    if anchor is None:
+        return []
+    return [word for word in words if abs(word['top'] - anchor['top']) <= HEADER_LINE_TOLERANCE]
+
+
+def fingerprint(words):
+    """Clave del layout: texto y posición horizontal de cada palabra del encabezado"""
+    signature = [(word['text'], round(word['x0'])) for word in sorted(words, key=lambda word: word['x0'])]
+    return hashlib.sha1(json.dumps(signature, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def learn_profile(page, key):
+    """Arma un perfil a partir de la tabla detectada con la estrategia genérica.
+
+    Devuelve None si la página no tiene una tabla con todas las columnas
+    esperadas.
+    """
+    for table in page.find_tables():
+        header = [' '.join((cell or '').split()) for cell in table.extract()[0]]
+        if not all(column in header for column in DEFAULT_COLUMNS.values()):
+            continue
+        vertical_lines = sorted({round(cell[0], 2) for cell in table.cells} | {round(cell[2], 2) for cell in table.cells})
+        return {
+            'name': f'aprendido-{key[:8]}',
+            'columns': dict(DEFAULT_COLUMNS),
+            'vertical_lines': vertical_lines,
+            'crop': None,
+        }
+    return None
+
+
+def table_settings(profile):
+    return {
+        'vertical_strategy': 'explicit',
+        'explicit_vertical_lines': profile['vertical_lines'],
+        'horizontal_strategy': 'lines',
+    }
+
+
+def extract_tables(page, profile):
+    """extract_tables con las columnas precalculadas del perfil y, si tiene, el recorte"""
+    if profile.get('crop'):
+        x0, top, x1, bottom = profile['crop']
+        page = page.crop((x0, top, x1, bottom if bottom is not None else page.height), strict=False)
+    return page.extract_tables(table_settings(profile))
+
+
+class LayoutRegistry:
+    """Índice en disco (JSON) de los layouts de proveedor conocidos.
+
+    Cada entrada, indexada por la huella del encabezado, guarda el nombre
+    del layout, el mapeo de columnas, las líneas verticales de la tabla y
+    un recorte opcional (x0, top, x1, bottom; bottom None = hasta el final
+    de la página). El archivo se vuelve a leer cuando cambia, así los
+    layouts aprendidos por un proceso los ven los demás.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._profiles = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self._profiles = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._mtime = mtime
+
+    def get(self, key):
+        with self._lock:
+            self._reload()
+            return self._profiles.get(key)
+
+    def add(self, key, profile):
+        """Agrega un perfil y reescribe el índice de forma atómica"""
+        with self._lock:
+            self._reload()
+            self._profiles[key] = profile
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._profiles, f, ensure_ascii=False, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
@@ -0,0 +1,229 @@
+import contextvars
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger('quote.metrics')
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Buckets por defecto, en segundos
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# Traza del request actual (etapas, páginas, filas)
+_trace = contextvars.ContextVar('quote_trace', default=None)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class Histogram:
+    """Histograma acumulativo con el formato de exposición de Prometheus"""
+
+    def __init__(self, name, documentation, buckets=TIME_BUCKETS, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, (counts, total) in series:
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                bucket_labels = _format_labels(labels + [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{bucket_labels} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {counts[-1]}')
+        return '\n'.join(lines)
+
+
+STAGE_SECONDS = Histogram('quote_stage_seconds', 'Tiempo real por etapa.', labelnames=['stage'])
+STAGE_CPU_SECONDS = Histogram('quote_stage_cpu_seconds', 'Tiempo de CPU por etapa.', labelnames=['stage'])
+PAGES = Histogram('quote_pages', 'Páginas por PDF procesado.', buckets=COUNT_BUCKETS)
+ROWS = Histogram('quote_rows', 'Filas por cotización extraída.', buckets=COUNT_BUCKETS)
+SKIPPED_TABLE_PAGES = Histogram('quote_skipped_table_pages', 'Páginas sin búsqueda de tablas por PDF.',
+                                buckets=COUNT_BUCKETS)
+SKIPPED_TEXT_PAGES = Histogram('quote_skipped_text_pages', 'Páginas sin búsqueda de totales por PDF.',
+                               buckets=COUNT_BUCKETS)
+OCR_PAGES = Histogram('quote_ocr_pages', 'Páginas leídas con OCR por PDF.', buckets=COUNT_BUCKETS)
+REQUEST_SECONDS = Histogram('quote_request_seconds', 'Tiempo total por request.', labelnames=['endpoint'])
+
+COUNTS = {
+    'pages': PAGES,
+    'rows': ROWS,
+    'skipped_table_pages': SKIPPED_TABLE_PAGES,
+    'skipped_text_pages': SKIPPED_TEXT_PAGES,
+    'ocr_pages': OCR_PAGES,
+}
+# Contadores: nombre interno -> (métrica, ayuda). Los que se suman en un hijo
+# del sandbox llegan al proceso del request con su traza (merge_trace)
+COUNTERS = {
+    'layout_hits': ('quote_layout_hits_total', 'PDFs con layout de proveedor conocido.'),
+    'layout_misses': ('quote_layout_misses_total', 'PDFs con layout desconocido.'),
+}
+_counter_values = dict.fromkeys(COUNTERS, 0)
+_counter_lock = threading.Lock()
+
+HISTOGRAMS = [STAGE_SECONDS, STAGE_CPU_SECONDS, PAGES, ROWS, SKIPPED_TABLE_PAGES, SKIPPED_TEXT_PAGES,
+              OCR_PAGES, REQUEST_SECONDS]
+
+
+def peak_rss_bytes():
+    """Pico de memoria residente del proceso (ru_maxrss está en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer:
+    """Acumula tiempo real y de CPU de una etapa que puede ejecutarse en varias partes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __enter__(self):
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall += time.perf_counter() - self._wall_start
+        self.cpu += time.process_time() - self._cpu_start
+
+    def record(self):
+        STAGE_SECONDS.observe(self.wall, stage=self.name)
+        STAGE_CPU_SECONDS.observe(self.cpu, stage=self.name)
+        trace = _trace.get()
+        if trace is not None:
+            trace['stages'][self.name] = {
+                'wall': round(self.wall, 4),
+                'cpu': round(self.cpu, 4),
+                'peak_rss_mb': round(peak_rss_bytes() / 2**20, 1),
+            }
+
+
+@contextmanager
+def stage(name):
+    timer = StageTimer(name)
+    with timer:
+        yield timer
+    timer.record()
+
+
+def timed(name):
+    """Decorador que mide cada llamada a la función como la etapa name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(**values):
+    """Registra conteos del documento (pages, rows, skipped_table_pages, skipped_text_pages, ocr_pages)"""
+    trace = _trace.get()
+    for name, value in values.items():
+        COUNTS[name].observe(value)
+        if trace is not None:
+            trace[name] = value
+
+
+def increment(name, value=1):
+    """Suma value al contador name del proceso y a la traza del request"""
+    with _counter_lock:
+        _counter_values[name] += value
+    trace = _trace.get()
+    if trace is not None:
+        counters = trace.setdefault('counters', {})
+        counters[name] = counters.get(name, 0) + value
+
+
+def start_trace(endpoint):
+    _trace.set({'endpoint': endpoint, 'start': time.perf_counter(), 'stages': {}})
+
+
+def finish_trace(status):
+    """Registra la duración del request y escribe una línea de log estructurada"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+    elapsed = time.perf_counter() - trace.pop('start')
+    REQUEST_SECONDS.observe(elapsed, endpoint=trace['endpoint'])
+    trace.update(status=status, seconds=round(elapsed, 4), peak_rss_mb=round(peak_rss_bytes() / 2**20, 1))
+    logger.info(json.dumps(trace, ensure_ascii=False))
+
+
+def export_trace():
+    """Quita y devuelve la traza del proceso actual, para enviarla al proceso padre"""
+    trace = _trace.get()
+    _trace.set(None)
+    return trace
+
+
+def merge_trace(child_trace):
+    """Registra en este proceso las etapas, conteos y contadores medidos en un proceso hijo"""
+    if not child_trace:
+        return
+    trace = _trace.get()
+    for name, values in child_trace['stages'].items():
+        STAGE_SECONDS.observe(values['wall'], stage=name)
+        STAGE_CPU_SECONDS.observe(values['cpu'], stage=name)
+        if trace is not None:
+            trace['stages'][name] = values
+    for name, histogram in COUNTS.items():
+        if name in child_trace:
+            histogram.observe(child_trace[name])
+            if trace is not None:
+                trace[name] = child_trace[name]
+    for name, value in child_trace.get('counters', {}).items():
+        increment(name, value)
+
+
+def render(extra_counters=()):
+    """Texto de /metrics; extra_counters es una lista de (nombre, ayuda, valor)"""
+    blocks = [histogram.render() for histogram in HISTOGRAMS]
+    blocks.append('# HELP process_peak_rss_bytes Pico de memoria residente del proceso.\n'
+                  '# TYPE process_peak_rss_bytes gauge\n'
+                  f'process_peak_rss_bytes {peak_rss_bytes()}')
+    with _counter_lock:
+        counters = [(metric, documentation, _counter_values[name])
+                    for name, (metric, documentation) in COUNTERS.items()]
+    for name, documentation, value in list(extra_counters) + counters:
+        blocks.append(f'# HELP {name} {documentation}\n# TYPE {name} counter\n{name} {value}')
+    return '\n'.join(blocks) + '\n'
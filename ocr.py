@@ -0,0 +1,201 @@
+import bisect
+import hashlib
+import io
+import shutil
+import subprocess
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from layouts import HEADER_KEYWORDS
+
+
+def _normalize(text):
+    """Minúsculas y sin acentos, para comparar con lo que devuelve el OCR"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def page_digest(page):
+    """Hash del contenido de una página escaneada: los datos crudos de sus imágenes"""
+    digest = hashlib.sha256(repr((page.width, page.height, page.rotation)).encode())
+    for image in page.images:
+        digest.update(image['stream'].get_rawdata() or b'')
+    return digest.hexdigest()
+
+
+def rasterize(page, dpi):
+    """PNG en escala de grises de la página a la resolución indicada"""
+    image = page.to_image(resolution=dpi).original.convert('L')
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def parse_tsv(tsv, dpi):
+    """Palabras del TSV de Tesseract, con coordenadas en puntos PDF"""
+    scale = 72 / dpi
+    words = []
+    rows = tsv.splitlines()
+    for row in rows[1:]:
+        fields = row.split('\t')
+        if len(fields) < 12 or fields[0] != '5' or not fields[11].strip():
+            continue
+        left, top, width, height = (int(value) for value in fields[6:10])
+        words.append({
+            'text': fields[11].strip(),
+            'x0': left * scale,
+            'x1': (left + width) * scale,
+            'top': top * scale,
+            'bottom': (top + height) * scale,
+            'conf': float(fields[10]),
+            'line': tuple(int(value) for value in fields[2:5]),
+        })
+    return words
+
+
+def digit_confidence(words):
+    """Confianza media de las palabras con dígitos; 0 si no se leyó nada, 100 si no hay números"""
+    if not words:
+        return 0
+    confidences = [word['conf'] for word in words if any(char.isdigit() for char in word['text'])]
+    return sum(confidences) / len(confidences) if confidences else 100
+
+
+def group_lines(words):
+    """Líneas de texto en orden de lectura, cada una con sus palabras de izquierda a derecha"""
+    lines = {}
+    for word in words:
+        lines.setdefault(word['line'], []).append(word)
+    ordered = sorted(lines.values(), key=lambda line: min(word['top'] for word in line))
+    return [sorted(line, key=lambda word: word['x0']) for line in ordered]
+
+
+def header_starts(line, headers):
+    """Inicio horizontal de cada columna, buscando la primera palabra de cada encabezado"""
+    starts = []
+    position = 0
+    for header in headers:
+        token = _normalize(header.split()[0])
+        while position < len(line) and _normalize(line[position]['text']) != token:
+            position += 1
+        if position == len(line):
+            return None
+        starts.append(line[position]['x0'])
+        position += 1
+    return starts
+
+
+def words_to_quote(words, columns, vertical_lines=None):
+    """Tablas (con el mismo formato que extract_tables) y texto de una página leída con OCR.
+
+    columns es el mapeo del perfil de layout; los encabezados de la tabla
+    salen de ahí y no del OCR, así coinciden con los de las páginas con texto.
+    Sólo se toman como filas las líneas con cantidad e importe.
+    """
+    lines = group_lines(words)
+    text = '\n'.join(' '.join(word['text'] for word in line) for line in lines)
+
+    keywords = [_normalize(keyword) for keyword in HEADER_KEYWORDS]
+    header_index = next((index for index, line in enumerate(lines)
+                         if any(_normalize(word['text']) in keywords for word in line)), None)
+    if header_index is None:
+        return [], text
+
+    headers = list(columns.values())
+    if vertical_lines and len(vertical_lines) == len(headers) + 1:
+        starts = list(vertical_lines[:-1])
+    else:
+        starts = header_starts(lines[header_index], headers)
+        if starts is None:
+            return [], text
+
+    required = [headers.index(columns[name]) for name in ('Cantidad', 'Importe')]
+    rows = []
+    for line in lines[header_index + 1:]:
+        cells = [[] for _ in headers]
+        for word in line:
+            center = (word['x0'] + word['x1']) / 2
+            cells[max(bisect.bisect_right(starts, center) - 1, 0)].append(word['text'])
+        row = [' '.join(cell) for cell in cells]
+        if all(any(char.isdigit() for char in row[index]) for index in required):
+            rows.append(row)
+
+    return ([[headers] + rows] if rows else []), text
+
+
+class OcrEngine:
+    """Lectura con Tesseract de las páginas sin capa de texto.
+
+    Cada página se rasteriza primero a la resolución más baja de dpi_steps;
+    si la confianza de los números queda por debajo de min_confidence se
+    repite a la siguiente. Tesseract corre como proceso aparte, así que las
+    páginas se leen en paralelo desde un pool de hilos; la rasterización
+    (pdfium no es thread-safe) queda en el hilo que llama. Las imágenes y el
+    resultado del OCR se guardan en cache por hash de la página.
+    """
+
+    def __init__(self, command='tesseract', lang='spa', dpi_steps=(150, 300), min_confidence=80,
+                 workers=2, cache=None):
+        self.command = command
+        self.lang = lang
+        self.dpi_steps = tuple(dpi_steps)
+        self.min_confidence = min_confidence
+        self.workers = workers
+        self.cache = cache
+        self._available = None
+
+    def available(self):
+        if self._available is None:
+            self._available = shutil.which(self.command) is not None
+        return self._available
+
+    def _cached(self, key):
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _store(self, key, value):
+        if self.cache is not None:
+            self.cache.put(key, value)
+
+    def _tesseract(self, png, dpi):
+        completed = subprocess.run(
+            [self.command, 'stdin', 'stdout', '-l', self.lang, '--psm', '6', '--dpi', str(dpi), 'tsv'],
+            input=png, capture_output=True, check=True
+        )
+        return parse_tsv(completed.stdout.decode('utf-8', errors='replace'), dpi)
+
+    def _read(self, key, png, dpi):
+        words = self._tesseract(png, dpi)
+        self._store(f'{key}-{dpi}-ocr', words)
+        return words
+
+    def read_pages(self, pages):
+        """Palabras de cada página (en puntos PDF), en el mismo orden que pages"""
+        keys = [page_digest(page) for page in pages]
+        results = [None] * len(pages)
+        pending = list(range(len(pages)))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for step, dpi in enumerate(self.dpi_steps):
+                last_step = step == len(self.dpi_steps) - 1
+                futures = {}
+                for index in pending:
+                    key = keys[index]
+                    words = self._cached(f'{key}-{dpi}-ocr')
+                    if words is not None:
+                        results[index] = words
+                        continue
+                    png = self._cached(f'{key}-{dpi}-png')
+                    if png is None:
+                        png = rasterize(pages[index], dpi)
+                        self._store(f'{key}-{dpi}-png', png)
+                    futures[index] = executor.submit(self._read, key, png, dpi)
+
+                for index, future in futures.items():
+                    results[index] = future.result()
+
+                # Las páginas con números poco confiables se repiten a más resolución
+                pending = [index for index in pending
+                           if not last_step and digit_confidence(results[index]) < self.min_confidence]
+                if not pending:
+                    break
+        return results
@@ -0,0 +1,214 @@
+import zlib
+
+# Anchos de glifos (en milésimas de em) de las fuentes estándar de PDF para
+# los caracteres 32-255 de WinAnsiEncoding, tomados de sus métricas AFM.
+
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278, 556,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015,
+    667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778, 667, 778,
+    722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556,
+    500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500,
+    278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584, 0, 0, 0, 222, 556, 333, 1000,
+    556, 556, 333, 1000, 667, 333, 1000, 0, 611, 0, 0, 222, 222, 333, 333, 350, 556,
+    1000, 333, 1000, 500, 333, 944, 0, 500, 667, 278, 333, 556, 556, 556, 556, 260, 556,
+    333, 737, 370, 556, 584, 333, 737, 333, 400, 584, 0, 0, 333, 556, 537, 278, 333, 0,
+    365, 556, 834, 834, 834, 611, 667, 667, 667, 667, 667, 667, 1000, 722, 667, 667,
+    667, 667, 278, 278, 278, 278, 722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722,
+    722, 722, 667, 667, 611, 556, 556, 556, 556, 556, 556, 889, 500, 556, 556, 556, 556,
+    278, 278, 278, 278, 556, 556, 556, 556, 556, 556, 556, 584, 611, 556, 556, 556, 556,
+    500, 556, 500,
+]
+
+_HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278, 556,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611, 975, 722,
+    722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778, 667, 778, 722,
+    667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556, 333, 556, 611, 556,
+    611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611, 611, 611, 389, 556, 333,
+    611, 556, 778, 556, 556, 500, 389, 280, 389, 584, 0, 0, 0, 278, 556, 500, 1000, 556,
+    556, 333, 1000, 667, 333, 1000, 0, 611, 0, 0, 278, 278, 500, 500, 350, 556, 1000,
+    333, 1000, 556, 333, 944, 0, 500, 667, 278, 333, 556, 556, 556, 556, 280, 556, 333,
+    737, 370, 556, 584, 333, 737, 333, 400, 584, 0, 0, 333, 611, 556, 278, 333, 0, 365,
+    556, 834, 834, 834, 611, 722, 722, 722, 722, 722, 722, 1000, 722, 667, 667, 667,
+    667, 278, 278, 278, 278, 722, 722, 778, 778, 778, 778, 778, 584, 778, 722, 722, 722,
+    722, 667, 667, 611, 556, 556, 556, 556, 556, 556, 889, 556, 556, 556, 556, 556, 278,
+    278, 278, 278, 611, 611, 611, 611, 611, 611, 611, 584, 611, 611, 611, 611, 611, 556,
+    611, 556,
+]
+
+_FONTS = {
+    False: ('F1', 'Helvetica', _HELVETICA_WIDTHS),
+    True: ('F2', 'Helvetica-Bold', _HELVETICA_BOLD_WIDTHS),
+}
+
+# Proporciones verticales de Helvetica respecto del tamaño de fuente
+ASCENT = 0.718
+DESCENT = 0.207
+
+
+def _encode(text):
+    return str(text).encode('cp1252', errors='replace')
+
+
+def encodable(*texts):
+    """Si los textos se pueden escribir con las fuentes estándar (cp1252) sin reemplazos por '?'"""
+    try:
+        for text in texts:
+            str(text).encode('cp1252')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def string_width(text, size, bold=False):
+    """Ancho en puntos de un texto en Helvetica"""
+    widths = _FONTS[bold][2]
+    total = 0
+    for code in _encode(text):
+        total += (widths[code - 32] if code >= 32 else 0) or 556
+    return total * size / 1000
+
+
+def _color(value):
+    value = value.lstrip('#')
+    return ' '.join(_number(int(value[i:i + 2], 16) / 255) for i in (0, 2, 4))
+
+
+def _number(value):
+    return ('%.3f' % value).rstrip('0').rstrip('.') or '0'
+
+
+def _escape(data):
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class ChunkBuffer:
+    """Destino de escritura que acumula bytes hasta retirarlos con drain()"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class PdfPage:
+    """Página con operadores de dibujo PDF; coordenadas en puntos desde abajo a la izquierda"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._ops = []
+
+    def rect(self, x, y, width, height, fill=None, stroke=None, line_width=1.0):
+        if fill is None and stroke is None:
+            return
+        ops = self._ops
+        if fill is not None:
+            ops.append(f'{_color(fill)} rg')
+        if stroke is not None:
+            ops.append(f'{_color(stroke)} RG {_number(line_width)} w')
+        paint = 'B' if fill is not None and stroke is not None else ('f' if fill is not None else 'S')
+        ops.append(f'{_number(x)} {_number(y)} {_number(width)} {_number(height)} re {paint}')
+
+    def text(self, x, y, text, size, bold=False, color='#000000', align='left', valign='baseline'):
+        """Escribe una línea de texto; align como ha= y valign como va= de matplotlib"""
+        if align == 'center':
+            x -= string_width(text, size, bold) / 2
+        elif align == 'right':
+            x -= string_width(text, size, bold)
+        if valign == 'center':
+            y -= (ASCENT - DESCENT) * size / 2
+        font = _FONTS[bold][0]
+        self._ops.append(
+            f'BT /{font} {_number(size)} Tf {_color(color)} rg {_number(x)} {_number(y)} Td ('
+            + _escape(_encode(text)).decode('latin-1') + ') Tj ET'
+        )
+
+    def content(self):
+        return '\n'.join(self._ops).encode('latin-1')
+
+
+class PdfWriter:
+    """Escritor mínimo de PDF que emite cada página apenas se agrega.
+
+    Usa las fuentes estándar Helvetica y Helvetica-Bold, por lo que no
+    necesita incrustar fuentes ni depender de un motor de dibujo.
+    """
+
+    def __init__(self, stream, compress=True):
+        self.stream = stream
+        self.compress = compress
+        self._offsets = {}
+        self._page_ids = []
+        self._position = 0
+        self._next_id = 5  # 1: catálogo, 2: árbol de páginas, 3 y 4: fuentes
+
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        for bold, obj_id in ((False, 3), (True, 4)):
+            base_font = _FONTS[bold][1].encode()
+            self._object(obj_id, b'<< /Type /Font /Subtype /Type1 /BaseFont /' + base_font
+                         + b' /Encoding /WinAnsiEncoding >>')
+
+    def _write(self, data):
+        self.stream.write(data)
+        self._position += len(data)
+
+    def _object(self, obj_id, body):
+        self._offsets[obj_id] = self._position
+        self._write(b'%d 0 obj\n' % obj_id + body + b'\nendobj\n')
+
+    def add_page(self, page):
+        content = page.content()
+        if self.compress:
+            self.add_compressed_page(page.width, page.height, [zlib.compress(content)])
+        else:
+            self._add_page(page.width, page.height, [content], b'')
+
+    def add_compressed_page(self, width, height, contents):
+        """Agrega una página con uno o más streams de contenido ya comprimidos con zlib.
+
+        Los streams se dibujan en orden, uno encima del otro; permite reusar
+        contenido ya generado (por ejemplo, desde una caché) sin recomprimirlo.
+        """
+        self._add_page(width, height, contents, b' /Filter /FlateDecode')
+
+    def _add_page(self, width, height, contents, content_filter):
+        content_ids = []
+        for content in contents:
+            content_id = self._next_id
+            self._next_id += 1
+            self._object(content_id, b'<< /Length %d' % len(content) + content_filter + b' >>\nstream\n'
+                         + content + b'\nendstream')
+            content_ids.append(content_id)
+
+        page_id = self._next_id
+        self._next_id += 1
+        refs = ' '.join('%d 0 R' % content_id for content_id in content_ids)
+        self._object(page_id, (
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] '
+            '/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %s >>'
+            % (_number(width), _number(height), refs if len(content_ids) == 1 else '[%s]' % refs)
+        ).encode())
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Escribe el árbol de páginas, la tabla xref y el trailer"""
+        kids = ' '.join('%d 0 R' % page_id for page_id in self._page_ids)
+        self._object(2, ('<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids))).encode())
+
+        xref_offset = self._position
+        size = self._next_id
+        lines = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        for obj_id in range(1, size):
+            lines.append(b'%010d 00000 n \n' % self._offsets[obj_id])
+        self._write(b''.join(lines))
+        self._write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_offset))
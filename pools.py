@@ -0,0 +1,88 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+
+def cpu_share():
+    """Núcleos que le tocan a cada worker de gunicorn (WEB_CONCURRENCY), al menos uno"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+
+
+class ProcessPool:
+    """ProcessPoolExecutor que se crea al primer uso y se reemplaza si se rompe.
+
+    Así los workers de gunicorn que no usan el pool no arrancan procesos, y
+    un pool heredado por fork no se reusa. Si un hijo muere el executor
+    queda roto (BrokenProcessPool): se descarta y el próximo trabajo va a
+    uno nuevo. Con max_tasks_per_child el pool se recicla después de
+    max_tasks_per_child * max_workers trabajos, para acotar la
+    fragmentación de memoria de los hijos.
+    """
+
+    def __init__(self, max_workers, max_tasks_per_child=None, initializer=None, initargs=()):
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._pid = None
+        self._submitted = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is not None and self._pid != os.getpid():
+                # Heredado por fork: los procesos son del padre
+                self._executor = None
+            if (self._executor is not None and self.max_tasks_per_child
+                    and self._submitted >= self.max_tasks_per_child * self.max_workers):
+                # Los trabajos en curso terminan en el pool anterior
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+                self._pid = os.getpid()
+                self._submitted = 0
+            return self._executor
+
+    def submit_all(self, calls):
+        """Envía las llamadas (func, args) a un mismo executor y devuelve (executor, futures)"""
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                futures = [executor.submit(func, *args) for func, args in calls]
+            except BrokenProcessPool:
+                # Un hijo murió con el pool ocioso: se reintenta una vez en uno nuevo
+                self.discard(executor)
+                if attempt:
+                    raise
+                continue
+            with self._lock:
+                self._submitted += len(futures)
+            for future in futures:
+                future.add_done_callback(partial(self._check, executor))
+            return executor, futures
+
+    def submit(self, func, *args):
+        return self.submit_all([(func, args)])[1][0]
+
+    def _check(self, executor, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self.discard(executor)
+
+    def discard(self, executor, kill=False):
+        """Deja de usar executor; con kill, termina también los trabajos que están corriendo"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if kill:
+            # ProcessPoolExecutor no permite cancelar un trabajo que ya empezó
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+
+def file_digest(source, chunk_size=1024 * 1024):
+    """SHA-256 del contenido de un archivo (ruta o archivo abierto, que se rebobina)"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return file_digest(f, chunk_size)
+
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(chunk_size), b''):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Caché en disco de los resultados de process_pdf, indexada por hash del PDF.
+
+    Cada entrada es un pickle con (df_result, resumen_df). La fecha de
+    modificación del archivo marca el último acceso (orden LRU) y la fecha
+    de creación viaja dentro del pickle para aplicar el TTL. Los contadores
+    de aciertos y fallos son por proceso.
+    """
+
+    def __init__(self, folder, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + '.pkl')
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Devuelve (df_result, resumen_df) o None si no hay una entrada vigente"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                created_at, result = pickle.load(f)
+        except OSError:
+            self._count(hit=False)
+            return None
+        except Exception:
+            # Entrada corrupta o de otra versión de pandas/numpy (AttributeError,
+            # ModuleNotFoundError, ...): se descarta y se vuelve a calcular
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        if time.time() - created_at > self.ttl:
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        # Marcar el acceso para el orden LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return result
+
+    def put(self, key, result):
+        """Guarda el resultado de forma atómica y aplica el límite de tamaño"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((time.time(), result), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Elimina las entradas menos usadas hasta quedar bajo max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
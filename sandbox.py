@@ -0,0 +1,108 @@
+import os
+import resource
+import signal
+from concurrent.futures import TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from pools import ProcessPool
+
+
+class BudgetExceeded(Exception):
+    """El trabajo superó alguno de los límites del sandbox (páginas, tiempo o memoria)"""
+
+
+# Pid del proceso si es un hijo del sandbox (los procesos que éste crea no lo son)
+_child_pid = None
+
+
+def _init_child(max_memory):
+    """Marca el proceso como hijo del sandbox y fija su límite de memoria (RLIMIT_AS)"""
+    global _child_pid
+    _child_pid = os.getpid()
+    if not max_memory:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = max_memory if hard == resource.RLIM_INFINITY else min(max_memory, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+# El hijo marca que venció el tiempo, por si algo en la pila envuelve la excepción
+_expired = False
+
+
+def _on_deadline(signum, frame):
+    global _expired
+    _expired = True
+    raise BudgetExceeded('deadline')
+
+
+def _run(func, args, deadline, max_memory):
+    """Ejecuta func en el hijo con alarma de tiempo y devuelve (resultado, traza)"""
+    global _expired
+    _expired = False
+    signal.signal(signal.SIGALRM, _on_deadline)
+    signal.setitimer(signal.ITIMER_REAL, deadline)
+    metrics.start_trace('sandbox')
+    try:
+        return func(*args), metrics.export_trace()
+    except MemoryError:
+        raise BudgetExceeded(f'El procesamiento superó el límite de memoria de {max_memory // 2**20} MB') from None
+    except Exception:
+        if _expired:
+            raise BudgetExceeded(f'El procesamiento superó el límite de {deadline:g} s') from None
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class Sandbox:
+    """Pool de procesos aislados con límites de tiempo y memoria por trabajo.
+
+    Cada hijo fija su límite de memoria al arrancar y el límite de tiempo lo
+    aplica el hijo con una alarma. Si un hijo muere (por ejemplo, lo mata el
+    kernel) o deja de responder, el pool se descarta y el trabajo falla en
+    el momento. Después de max_tasks_per_child trabajos por proceso el pool
+    se reemplaza por uno nuevo para acotar la fragmentación de memoria.
+    """
+
+    def __init__(self, max_workers=2, max_tasks_per_child=50, deadline=50, max_memory=1024 * 1024 * 1024, grace=5):
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.deadline = deadline
+        self.max_memory = max_memory
+        self.grace = grace
+        self._pool = ProcessPool(max_workers, max_tasks_per_child, initializer=_init_child, initargs=(max_memory,))
+
+    @staticmethod
+    def in_child():
+        """True dentro de un hijo del sandbox"""
+        return _child_pid == os.getpid()
+
+    def run(self, func, *args):
+        """Ejecuta func(*args) en un hijo; los errores del hijo se vuelven a lanzar acá"""
+        return self.run_many((func, args))[0]
+
+    def run_many(self, *calls):
+        """Ejecuta varias llamadas (func, args) en paralelo y devuelve sus resultados en orden"""
+        futures = []
+        results = []
+        try:
+            executor, futures = self._pool.submit_all(
+                [(_run, (func, args, self.deadline, self.max_memory)) for func, args in calls]
+            )
+            for future in futures:
+                # El doble del límite cubre la espera en la cola del pool
+                result, trace = future.result(2 * self.deadline + self.grace)
+                metrics.merge_trace(trace)
+                results.append(result)
+        except TimeoutError:
+            self._pool.discard(executor, kill=True)
+            raise BudgetExceeded(f'El procesamiento superó el límite de {self.deadline:g} s') from None
+        except BrokenProcessPool:
+            # El pool roto ya se descartó; el próximo trabajo usa uno nuevo
+            raise BudgetExceeded('El proceso terminó inesperadamente (posible exceso de memoria)') from None
+        finally:
+            for future in futures:
+                future.cancel()
+        return results
@@ -0,0 +1,73 @@
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import amounts  # noqa: E402
+
+
+@pytest.mark.parametrize('values, expected', [
+    (['1.234,56', '10,5'], ','),
+    (['1,234.56', '10.5'], '.'),
+    # Empate (o nada que decida): se usa '.'
+    (['1.234,56', '1,234.56'], '.'),
+    ([], '.'),
+    # Un único separador seguido de tres dígitos es ambiguo y no vota
+    (['1.234'], '.'),
+    (['1,234'], '.'),
+    (['1,234', '5,5'], ','),
+    (['1.234', '5.5'], '.'),
+    # El separador repetido sólo puede ser el de miles
+    (['1.234.567'], ','),
+    (['1,234,567'], '.'),
+])
+def test_detect_decimal(values, expected):
+    assert amounts.detect_decimal(values) == expected
+
+
+def test_detect_decimal_uses_all_columns():
+    assert amounts.detect_decimal(['1.234'], ['', None, '7,25']) == ','
+
+
+@pytest.mark.parametrize('value, decimal, expected', [
+    ('1.234,56', ',', 1234.56),
+    ('1,234.56', '.', 1234.56),
+    ('1.234', ',', 1234),
+    ('1.234', '.', 1.234),
+    ('-1.234,56', ',', -1234.56),
+    ('-0,5', ',', -0.5),
+    ('$ 10,00', ',', 10.0),
+    # Separador al final, como el punto que cierra una oración
+    ('5.', '.', 5.0),
+    ('5,', ',', 5.0),
+    ('1.234,56.', ',', 1234.56),
+    ('0.1', '.', 0.1),
+])
+def test_parse_numbers(value, decimal, expected):
+    assert amounts.parse_numbers([value], decimal).tolist() == [expected]
+
+
+def test_parse_numbers_rounds_once():
+    # 0.1 + 0.2 sumados como floats no dan 0.3; la conversión no acumula errores
+    assert amounts.parse_numbers(['0,3', '1.000,30'], ',').tolist() == [0.3, 1000.3]
+
+
+def test_parse_numbers_keeps_integers():
+    result = amounts.parse_numbers(['1', '-2', '3.000'], ',')
+    assert result.dtype == 'int64'
+    assert result.tolist() == [1, -2, 3000]
+
+
+def test_parse_numbers_invalid_is_nan():
+    result = amounts.parse_numbers(['', None, 'abc', '1,2,3.4.5', '.', '12'], ',').tolist()
+    assert all(math.isnan(value) for value in result[:5])
+    assert result[5] == 12
+
+
+def test_parse_numbers_long_values():
+    # Más de 15 dígitos no entran exactos en un float64: se convierten con pd.to_numeric
+    result = amounts.parse_numbers(['1.234.567.890.123.456,78', '-12345678901234567', '1,5'], ',').tolist()
+    assert result == [1234567890123456.78, -12345678901234567.0, 1.5]
@@ -0,0 +1,38 @@
+import io
+import os
+import re
+import sys
+import zipfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def sheet_rows(output):
+    """{número de fila: alto o None} de la primera hoja del Excel"""
+    xml = zipfile.ZipFile(output).read('xl/worksheets/sheet1.xml').decode('utf-8')
+    return {int(row): float(height) if height else None
+            for row, height in re.findall(r'<row r="(\d+)"(?:[^>]* ht="([\d.]+)")?', xml)}
+
+
+def test_generate_excel_writes_spacer_rows():
+    df_result = pd.DataFrame({
+        'Descripción Artículo': ['Tornillo', 'Tuerca', 'Arandela'],
+        'Desc. Adicional': ['', 'M6', None],
+        'Cantidad': [1.0, 2.0, 3.0],
+        'Precio': [10.0, 5.5, 0.25],
+        '% IVA': [21.0, 21.0, 10.5],
+        'Precio Neto': [10.0, 11.0, 0.75],
+    })
+    resumen_df = pd.DataFrame({'Concepto': ['Subtotal', 'Total'], 'Importe': [21.75, 26.0]})
+    rows = sheet_rows(app.generate_excel(df_result, resumen_df, 'ACME', '0001', '2026-01-01', output=io.BytesIO()))
+
+    # En constant_memory las filas sin celdas se pierden con su alto
+    assert sorted(rows) == list(range(1, max(rows) + 1))
+    assert [rows[3], rows[4], rows[7]] == [5, 5, 10]
+    table_end = 9 + len(df_result)
+    assert rows[table_end] == 10
+    assert max(rows) == table_end + 1 + len(resumen_df) + 2 + len(app.CONDITIONS)
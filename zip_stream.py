@@ -0,0 +1,41 @@
+import shutil
+import zipfile
+
+
+class ZipStream:
+    """ZIP que se arma de a un archivo sin un destino posicionable.
+
+    zipfile acepta destinos no posicionables (usa descriptores de datos), así
+    que cada método devuelve los bytes escritos desde la llamada anterior y
+    el ZIP no se escribe a disco. Quien llama decide si envía cada parte
+    enseguida o las junta: /upload con output=both junta las tres partes
+    (PDF, Excel y directorio central), así que ese ZIP sí queda completo en
+    memoria, comprimido, antes de responder.
+    """
+
+    def __init__(self, compression=zipfile.ZIP_DEFLATED):
+        self._chunks = []
+        self._zip = zipfile.ZipFile(self, 'w', compression)
+
+    # Interfaz de archivo que usa zipfile
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+    def add_fileobj(self, arcname, src, chunk_size=1024 * 1024):
+        with self._zip.open(arcname, 'w') as dst:
+            shutil.copyfileobj(src, dst, chunk_size)
+        return self._drain()
+
+    def close(self):
+        """Escribe el directorio central del ZIP"""
+        self._zip.close()
+        return self._drain()